@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# The test boards named <board>-negative-*.kicad_pcb are copies of <board>.kicad_pcb moved by these offsets into
+# the other quadrants. The case made from them has to be the same, only moved by the same offset.
+import logging
+import sys
+
+from turbocase.kicad import load_pcb
+
+offsets = {
+    'negative-x': (-200, 0),
+    'negative-y': (0, -200),
+    'negative-xy': (-200, -200),
+}
+
+boards = {
+    'demo': ['negative-x', 'negative-y', 'negative-xy'],
+    'mountingholes': ['negative-xy'],
+}
+
+
+def close(a, b):
+    return all(abs(x - y) < 1e-6 for x, y in zip(a, b))
+
+
+def main():
+    logging.disable(logging.CRITICAL)
+    failed = False
+    for board, variants in boards.items():
+        reference = load_pcb(f'test-boards/{board}.kicad_pcb')
+        for variant in variants:
+            name = f'{board}-{variant}'
+            dx, dy = offsets[variant]
+            case = load_pcb(f'test-boards/{name}.kicad_pcb')
+            center = case.get_center()
+            bounds = case.get_inner_bounds()
+            checks = {
+                'case size': (case.get_case_size(), reference.get_case_size()),
+                'center': ((center[0] - dx, center[1] - dy), reference.get_center()),
+                'inner bounds': ((bounds[0] - dx, bounds[1] - dy, bounds[2] - dx, bounds[3] - dy),
+                                 reference.get_inner_bounds()),
+            }
+            print(f'testing {name}...')
+            for what, (value, expected) in checks.items():
+                if not close(value, expected):
+                    print(f'  {what} is {value}, expected {expected}')
+                    failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
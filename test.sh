@@ -3,4 +3,6 @@ set -euo pipefail
 for file in test-boards/*.kicad_pcb; do
   echo "testing $file..."
   turbocase --verbose "$file" out.scad
-done
\ No newline at end of file
+done
+
+python3 test-quadrants.py
@@ -1,7 +1,11 @@
 import argparse
+import json
 import logging
+import sys
+import time
 
-from turbocase import scad, svg
+from turbocase import check, export, mesh, scad, svg
+from turbocase.quality import tiers
 from turbocase.kicad import load_pcb
 
 
@@ -29,29 +33,27 @@ class NiceLogFormatter(logging.Formatter):
         return formatter.format(record)
 
 
-def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument('pcb', help='Input kicad PCB file')
-    parser.add_argument('output', help='Generated openSCAD case template')
-    parser.add_argument('--layer', help='Layer with the case inner-outline [defaults to User.6]', default='User.6')
-    parser.add_argument('--lid-layer', help='Layer with lid-specific holes [defaults to User.7]', default='User.7')
-    parser.add_argument('--bottom', help='Bottom thickness in mm [default 1.2]', default=1.2, type=float)
-    parser.add_argument('--wall', help='Wall thickness in mm [default 1.2]', default=1.2, type=float)
-    parser.add_argument('--standoff', help='Height generated for the PCB mounts in mm[default 5]', default=5,
-                        type=float)
-    parser.add_argument('--show-pcb', help='Show the PCB placeholder by default [default false]', default=False,
-                        action='store_true')
-    parser.add_argument('--lid', help='Lid construction model', choices=['cap', 'inner-fit'], default='cap')
+def positive_float(value):
+    try:
+        result = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'invalid number: {value!r}')
+    if not result > 0:
+        raise argparse.ArgumentTypeError(f'has to be larger than 0, got {value}')
+    return result
 
-    parser.add_argument('--verbose', '-v', action='store_true', help='Show log messages')
-    parser.add_argument('--debug', action='store_true', help='Display a lot of debugging info')
 
-    args = parser.parse_args()
+def non_negative_int(value):
+    try:
+        result = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'invalid integer: {value!r}')
+    if result < 0:
+        raise argparse.ArgumentTypeError(f'can not be negative, got {value}')
+    return result
 
-    format = 'scad'
-    if args.output.endswith('.svg'):
-        format = 'svg'
 
+def setup_logging(args):
     ch = logging.StreamHandler()
     ch.setFormatter(NiceLogFormatter())
     if args.verbose:
@@ -61,18 +63,53 @@ def main():
     else:
         logging.basicConfig(handlers=[ch])
 
-    log = logging.getLogger('main')
 
+def add_case_arguments(parser):
+    parser.add_argument('--layer', help='Layer with the case inner-outline [defaults to User.6]', default='User.6')
+    parser.add_argument('--lid-layer', help='Layer with lid-specific holes [defaults to User.7]', default='User.7')
+    parser.add_argument('--bottom', help='Bottom thickness in mm [default 1.2]', default=1.2, type=float)
+    parser.add_argument('--wall', help='Wall thickness in mm [default 1.2]', default=1.2, type=float)
+    parser.add_argument('--standoff', help='Height generated for the PCB mounts in mm[default 5]', default=5,
+                        type=float)
+    parser.add_argument('--show-pcb', help='Show the PCB placeholder by default [default false]', default=False,
+                        action='store_true')
+    parser.add_argument('--lid', help='Lid construction model', choices=['cap', 'inner-fit'], default='cap')
+    parser.add_argument('--arc-tolerance', help='Maximum deviation in mm between arcs and their polygon '
+                                                'approximation [default depends on --quality]', type=positive_float)
+    parser.add_argument('--simplify', help='Remove outline points that deviate less than this many mm from a '
+                                           'straight line [default off]', type=positive_float)
+    parser.add_argument('--precompute-offsets', help='Calculate the wall and lid outline offsets in turbocase instead '
+                                                     'of in OpenSCAD [default false]', default=False,
+                        action='store_true')
+    parser.add_argument('--csg', help='Structure of the generated CSG tree, grouped unions nearby cutouts and '
+                                      'caches the mounts with render() for faster previews [default flat]',
+                        choices=['flat', 'grouped'], default='flat')
+    parser.add_argument('--no-prune-connectors', help='Also cut out the connectors that are clear of the walls and '
+                                                      'the lid', dest='prune_connectors', default=True,
+                        action='store_false')
+    parser.add_argument('--quality', help='Number of facets for curves in OpenSCAD and the arc density of the '
+                                          'outlines, draft is fast to preview [default normal]',
+                        choices=list(tiers), default='normal')
+    parser.add_argument('--precision', help='Number of decimals for the coordinates in the generated files '
+                                            '[default 4]', default=4, type=non_negative_int)
+
+
+def load_case(args):
+    log = logging.getLogger('main')
     log.info(f'Loading pcb from "{args.pcb}"')
     log.info(f'Using case drawing from layer [{args.layer}] and lid features from [{args.lid_layer}]')
-    case = load_pcb(args.pcb, args.layer, args.lid_layer)
+    tier = tiers[args.quality]
+    arc_tolerance = args.arc_tolerance
+    if arc_tolerance is None:
+        arc_tolerance = tier['arc_tolerance']
+    case = load_pcb(args.pcb, args.layer, args.lid_layer, cache=not args.no_cache, arc_tolerance=arc_tolerance)
 
     log.info(f"PCB loaded")
     log.info(f"   Case size:         {case.get_case_size()[0]}mm x {case.get_case_size()[1]}mm")
     log.info(f"   Mounting holes:    {len(case.pcb_mount)}")
     log.info(f"   Parts with height: {len(case.connectors)}")
     log.info(f"   Case prefabs:      {len(case.parts)}")
-    inserts = case.get_inserts()
+    inserts = sorted(case.get_inserts())
     di = []
     for i in inserts:
         di.append(i[0])
@@ -83,16 +120,179 @@ def main():
     case.wall_thickness = args.wall
     case.standoff_height = args.standoff
     case.lid_model = args.lid
+    case.quality = args.quality
+    case.prune_connectors = args.prune_connectors
+    case.precision = args.precision
 
-    log.info(f'Generating output at "{args.output}"')
-    if format == 'scad':
-        code = scad.generate(case, show_pcb=args.show_pcb)
+    if args.simplify is not None:
+        case.simplify(args.simplify)
+    return case
+
+
+def main_check(argv):
+    parser = argparse.ArgumentParser(prog='turbocase check',
+                                     description='Check for overlapping mounts and connectors and for items outside '
+                                                 'the case outline')
+    parser.add_argument('pcb', help='Input kicad PCB file')
+    parser.add_argument('--output', '-o', help='Write the JSON report to this file instead of stdout')
+    parser.add_argument('--layer', help='Layer with the case inner-outline [defaults to User.6]', default='User.6')
+    parser.add_argument('--lid-layer', help='Layer with lid-specific holes [defaults to User.7]', default='User.7')
+    parser.add_argument('--no-cache', help='Always parse the PCB file instead of using the cached board data',
+                        default=False, action='store_true')
+    parser.add_argument('--verbose', '-v', action='store_true', help='Show log messages')
+    parser.add_argument('--debug', action='store_true', help='Display a lot of debugging info')
+    args = parser.parse_args(argv)
+
+    setup_logging(args)
+    log = logging.getLogger('main')
+
+    case = load_pcb(args.pcb, args.layer, args.lid_layer, cache=not args.no_cache)
+    start = time.perf_counter()
+    report = check.check(case)
+    log.info(f'Checked {report["items"]} items in {(time.perf_counter() - start) * 1000:.1f}ms')
+    report = {'pcb': args.pcb, **report}
+
+    code = json.dumps(report, indent=2) + '\n'
+    if args.output:
         with open(args.output, 'w') as handle:
             handle.write(code)
+    else:
+        sys.stdout.write(code)
+
+    for overlap in report['overlaps']:
+        log.warning(f'{overlap["a"]["kind"]} {overlap["a"]["reference"]} overlaps '
+                    f'{overlap["b"]["kind"]} {overlap["b"]["reference"]}')
+    for item in report['outside']:
+        log.warning(f'{item["kind"]} {item["reference"]} is not inside the case outline')
+    if report['overlaps'] or report['outside']:
+        sys.exit(1)
+
+
+def main_export(argv):
+    parser = argparse.ArgumentParser(prog='turbocase export',
+                                     description='Generate the case and render it with OpenSCAD, running the '
+                                                 'renders in parallel')
+    parser.add_argument('pcb', help='Input kicad PCB file')
+    parser.add_argument('stem', help='Base name of the generated files, <stem>_case.scad renders to '
+                                     '<stem>_case.stl')
+    add_case_arguments(parser)
+    parser.add_argument('--targets', help='Files to render [default case lid]', nargs='+',
+                        choices=['case', 'lid', 'png'], default=['case', 'lid'])
+    parser.add_argument('--jobs', '-j', help='Number of OpenSCAD processes to run at the same time [default is the '
+                                             'number of CPUs]', type=int)
+    parser.add_argument('--timeout', help='Seconds a single render may take before it is stopped [default 600]',
+                        default=600, type=float)
+    parser.add_argument('--openscad', help='OpenSCAD executable [defaults to $OPENSCAD or openscad]')
+    parser.add_argument('--report', help='Write the JSON report to this file instead of stdout')
+    parser.add_argument('--no-cache', help='Always parse the PCB file instead of using the cached board data',
+                        default=False, action='store_true')
+    parser.add_argument('--verbose', '-v', action='store_true', help='Show log messages')
+    parser.add_argument('--debug', action='store_true', help='Display a lot of debugging info')
+    args = parser.parse_args(argv)
+
+    setup_logging(args)
+    log = logging.getLogger('main')
+
+    try:
+        openscad = export.find_openscad(args.openscad)
+    except FileNotFoundError as e:
+        parser.error(str(e))
+
+    case = load_case(args)
+    stem = args.stem[:-5] if args.stem.endswith('.scad') else args.stem
+    for path, written in scad.write_split(case, stem, show_pcb=args.show_pcb,
+                                          precompute_offsets=args.precompute_offsets, csg=args.csg):
+        log.info(f'Wrote {path}' if written else f'{path} is unchanged')
+
+    start = time.perf_counter()
+    results = export.export(openscad, export.make_targets(stem, args.targets), jobs=args.jobs,
+                            timeout=args.timeout)
+    report = {
+        'pcb': args.pcb,
+        'openscad': openscad,
+        'seconds': round(time.perf_counter() - start, 3),
+        'targets': results,
+    }
+
+    code = json.dumps(report, indent=2) + '\n'
+    if args.report:
+        with open(args.report, 'w') as handle:
+            handle.write(code)
+    else:
+        sys.stdout.write(code)
+
+    if any(result['returncode'] != 0 for result in results):
+        sys.exit(1)
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == 'check':
+        return main_check(sys.argv[2:])
+    if len(sys.argv) > 1 and sys.argv[1] == 'export':
+        return main_export(sys.argv[2:])
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('pcb', help='Input kicad PCB file')
+    parser.add_argument('output', help='Generated openSCAD case template, use - to write it to stdout. An .svg, .stl '
+                                       'or .3mf extension writes that format instead')
+    add_case_arguments(parser)
+    parser.add_argument('--split', help='Write the modules to <output>_lib.scad and the case and lid to '
+                                        '<output>_case.scad and <output>_lid.scad so they can be rendered in '
+                                        'parallel', default=False, action='store_true')
+    parser.add_argument('--force', help='Write the OpenSCAD output even when the existing file has the same content',
+                        default=False, action='store_true')
+    parser.add_argument('--no-cache', help='Always parse the PCB file instead of using the cached board data',
+                        default=False, action='store_true')
+
+    parser.add_argument('--verbose', '-v', action='store_true', help='Show log messages')
+    parser.add_argument('--debug', action='store_true', help='Display a lot of debugging info')
+
+    args = parser.parse_args()
+
+    format = 'scad'
+    if args.output.endswith('.svg'):
+        format = 'svg'
+    elif args.output.endswith('.stl'):
+        format = 'stl'
+    elif args.output.endswith('.3mf'):
+        format = '3mf'
+    if args.split and (format != 'scad' or args.output == '-'):
+        parser.error('--split needs an output filename for the OpenSCAD file')
+
+    setup_logging(args)
+    log = logging.getLogger('main')
+
+    case = load_case(args)
+
+    log.info(f'Generating output at "{args.output}"')
+    if format == 'scad':
+        if args.split:
+            stem = args.output[:-5] if args.output.endswith('.scad') else args.output
+            for path, written in scad.write_split(case, stem, show_pcb=args.show_pcb,
+                                                  precompute_offsets=args.precompute_offsets, csg=args.csg,
+                                                  force=args.force):
+                log.info(f'   Wrote {path}' if written else f'   {path} is unchanged')
+        elif args.output == '-':
+            scad.write(case, sys.stdout, show_pcb=args.show_pcb, precompute_offsets=args.precompute_offsets,
+                       csg=args.csg)
+        else:
+            chunks = scad.generate_chunks(case, show_pcb=args.show_pcb, precompute_offsets=args.precompute_offsets,
+                                          csg=args.csg)
+            if not scad.write_file(args.output, chunks, force=args.force):
+                log.info(f'"{args.output}" is unchanged, not writing it')
     elif format == 'svg':
         code = svg.generate(case, show_pcb=args.show_pcb)
         with open(args.output, 'w') as handle:
             handle.write(code)
+    elif format in ('stl', '3mf'):
+        start = time.perf_counter()
+        model = mesh.build(case)
+        if format == 'stl':
+            with open(args.output, 'wb') as handle:
+                mesh.write_stl(model, handle)
+        else:
+            mesh.write_3mf(model, args.output, case.precision)
+        log.info(f'   Wrote {len(model.triangles)} triangles in {(time.perf_counter() - start) * 1000:.1f}ms')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,118 @@
+import hashlib
+import logging
+import os
+import pickle
+
+# Bump this when the layout of the cached entries changes
+_format = 10
+
+max_size = 64 * 1024 * 1024
+max_entries = 256
+
+_source_digest = None
+
+
+def cache_dir():
+    if 'TURBOCASE_CACHE_DIR' in os.environ:
+        return os.environ['TURBOCASE_CACHE_DIR']
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'turbocase')
+
+
+def _get_source_digest():
+    # The cached result depends on the extraction code and the part library, so any change to the turbocase
+    # sources invalidates the cache
+    global _source_digest
+    if _source_digest is None:
+        digest = hashlib.sha256()
+        root = os.path.dirname(os.path.abspath(__file__))
+        for path, dirs, files in sorted(os.walk(root)):
+            dirs.sort()
+            for name in sorted(files):
+                if name.endswith('.py'):
+                    with open(os.path.join(path, name), 'rb') as handle:
+                        digest.update(handle.read())
+        _source_digest = digest.hexdigest()
+    return _source_digest
+
+
+def make_key(pcb_file, *options):
+    digest = hashlib.sha256()
+    digest.update(f'{_format}\0{_get_source_digest()}\0'.encode())
+    for option in options:
+        digest.update(f'{option}\0'.encode())
+    with open(pcb_file, 'rb') as handle:
+        while True:
+            block = handle.read(1 << 20)
+            if not block:
+                break
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load(key):
+    log = logging.getLogger('cache')
+    path = os.path.join(cache_dir(), key + '.pickle')
+    try:
+        with open(path, 'rb') as handle:
+            result = pickle.load(handle)
+        # The modification time is used as the last access time for the LRU eviction
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        log.warning(f'Could not read cached board {path}: {e}')
+        return None
+    return result
+
+
+def store(key, value):
+    log = logging.getLogger('cache')
+    directory = cache_dir()
+    path = os.path.join(directory, key + '.pickle')
+    temp = f'{path}.{os.getpid()}.tmp'
+    try:
+        os.makedirs(directory, exist_ok=True)
+        with open(temp, 'wb') as handle:
+            pickle.dump(value, handle, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp, path)
+    except (OSError, pickle.PicklingError, TypeError, AttributeError) as e:
+        log.warning(f'Could not write board cache to {directory}: {e}')
+        return
+    finally:
+        # Only left behind when writing or renaming failed
+        try:
+            os.unlink(temp)
+        except OSError:
+            pass
+    evict(directory)
+
+
+def evict(directory=None):
+    """
+    Remove the least recently used entries until the cache fits within max_size and max_entries
+    """
+    directory = directory or cache_dir()
+    entries = []
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return
+    for name in names:
+        if not name.endswith('.pickle'):
+            continue
+        try:
+            stat = os.stat(os.path.join(directory, name))
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, name))
+
+    entries.sort(reverse=True)
+    total = 0
+    for i, (mtime, size, name) in enumerate(entries):
+        total += size
+        if i > 0 and (total > max_size or i >= max_entries):
+            try:
+                os.unlink(os.path.join(directory, name))
+            except OSError:
+                pass
@@ -1,3 +1,7 @@
+from turbocase import geometry
+from turbocase.vector import PointBuffer
+
+
 class Connector:
     def __init__(self):
         self.reference = None
@@ -31,7 +35,9 @@ class Mount:
 
 class Part:
     def __init__(self):
+        self.reference = None
         self.position = None
+        self.bounds = None
         self.description = None
 
         self.add = None
@@ -49,13 +55,17 @@ class Case:
     connectors: list[Connector]
 
     def __init__(self):
-        self.inner_path = []
+        self.inner_path = PointBuffer()
         self.pcb_mount = []
         self.pcb_thickness = 1.6
-        self.pcb_path = []
+        self.pcb_path = PointBuffer()
         self.pcb_holes = []
         self.lid_holes = []
         self.lid_model = "cap"
+        self.quality = "normal"
+        self.prune_connectors = True
+        # Number of decimals written for coordinates in the generated files
+        self.precision = 4
         self.floor_thickness = 1.2
         self.wall_thickness = 1.2
         self.standoff_height = 5
@@ -69,21 +79,19 @@ class Case:
         self.parts = []
         self.max_part_height = 0
 
+    def simplify(self, tolerance):
+        """
+        Drop outline points that are within tolerance in mm from a straight line through their neighbours
+        """
+        self.inner_path = geometry.simplify(self.inner_path, tolerance)
+        self.pcb_path = geometry.simplify(self.pcb_path, tolerance)
+        for hole in self.pcb_holes + self.cutouts + self.lid_holes:
+            for shape in [hole] + hole.islands:
+                if not shape.is_circle:
+                    shape.simplify(tolerance)
+
     def get_path_bounds(self, path):
-        if path[0] == 'circle':
-            radius = path[2]
-            pos = path[1]
-            return pos[0] - radius, pos[0] + radius, pos[1] - radius, pos[1] + radius
-        min_x = path[0][0]
-        max_x = 0
-        min_y = path[0][1]
-        max_y = 0
-        for point in path:
-            min_x = min(min_x, point[0])
-            max_x = max(max_x, point[0])
-            min_y = min(min_y, point[1])
-            max_y = max(max_y, point[1])
-        return min_x, min_y, max_x, max_y
+        return geometry.path_bounds(path)
 
     def get_inner_bounds(self):
         return self.get_path_bounds(self.inner_path)
@@ -0,0 +1,133 @@
+import math
+
+from turbocase import geometry, spatial
+
+
+class Item:
+    """
+    A mount, connector or part placed on the board, with its outline in board coordinates
+    """
+
+    def __init__(self, kind, reference, position, points=None, radius=None):
+        self.kind = kind
+        self.reference = reference
+        self.position = position
+        # Either a polygon or a circle around position
+        self.points = points
+        self.radius = radius
+
+        if radius is not None:
+            self.bounds = (position[0] - radius, position[1] - radius, position[0] + radius, position[1] + radius)
+        elif points is not None:
+            self.bounds = geometry.path_bounds(points)
+        else:
+            self.bounds = (position[0], position[1], position[0], position[1])
+
+    def describe(self):
+        return {
+            'kind': self.kind,
+            'reference': self.reference,
+            'position': [self.position[0], self.position[1]],
+        }
+
+
+def _polygons_overlap(a, b):
+    # Separating axis test, footprint outlines are always convex
+    for points in (a, b):
+        for p, q in geometry.polygon_edges(points):
+            nx, ny = q[1] - p[1], p[0] - q[0]
+            pa = [x * nx + y * ny for x, y in a]
+            pb = [x * nx + y * ny for x, y in b]
+            if max(pa) <= min(pb) or max(pb) <= min(pa):
+                return False
+    return True
+
+
+def _circle_polygon_overlap(center, radius, points):
+    if geometry.point_in_path(center, points):
+        return True
+    for p, q in geometry.polygon_edges(points):
+        if geometry.segment_point_distance(center, p, q) < radius:
+            return True
+    return False
+
+
+def overlaps(a, b):
+    if a.radius is not None and b.radius is not None:
+        return math.hypot(a.position[0] - b.position[0], a.position[1] - b.position[1]) < a.radius + b.radius
+    if a.radius is not None:
+        return _circle_polygon_overlap(a.position, a.radius, b.points)
+    if b.radius is not None:
+        return _circle_polygon_overlap(b.position, b.radius, a.points)
+    return _polygons_overlap(a.points, b.points)
+
+
+def _make_items(case):
+    items = []
+    for mount in case.pcb_mount:
+        items.append(Item('mount', mount.ref, mount.position, radius=mount.size / 2))
+    for connector in case.connectors:
+        items.append(Item('connector', connector.reference, connector.position,
+                          points=geometry.rotated_rect(connector.position, connector.bounds)))
+    for part in case.parts:
+        points = None
+        if part.bounds is not None:
+            points = geometry.rotated_rect(part.position, part.bounds)
+        items.append(Item('part', part.reference or part.description, part.position, points=points))
+    return items
+
+
+def _should_collide(a, b):
+    # TurboCase parts are made to cut into connectors and the case, only standoffs and connector bodies can't
+    # share space
+    if a.kind == 'part' or b.kind == 'part':
+        return False
+    return True
+
+
+def check(case):
+    """
+    Look for mounts and connectors that overlap each other and for items that are not inside the case outline.
+    Returns a report that can be serialized as JSON.
+    """
+    items = _make_items(case)
+    report = {
+        'items': len(items),
+        'overlaps': [],
+        'outside': [],
+    }
+
+    if len(items):
+        sizes = sorted(max(i.bounds[2] - i.bounds[0], i.bounds[3] - i.bounds[1]) for i in items)
+        index = spatial.GridIndex(sizes[len(sizes) // 2] or 1)
+        for i, item in enumerate(items):
+            index.insert(i, item.bounds)
+
+        for i, item in enumerate(items):
+            for j in index.query(item.bounds):
+                if j <= i:
+                    continue
+                other = items[j]
+                if not _should_collide(item, other):
+                    continue
+                b = other.bounds
+                if b[0] > item.bounds[2] or b[2] < item.bounds[0] or b[1] > item.bounds[3] or b[3] < item.bounds[1]:
+                    continue
+                if overlaps(item, other):
+                    report['overlaps'].append({'a': item.describe(), 'b': other.describe()})
+
+    if len(case.inner_path) == 0:
+        return report
+    outline = spatial.Outline(case.inner_path)
+    for item in items:
+        if item.kind == 'mount':
+            # Standoffs have to fit completely inside the case
+            if not outline.contains(item.position) or not outline.clearance(item.position, item.radius):
+                report['outside'].append(item.describe())
+        elif item.points is not None:
+            # Connectors and parts are allowed to stick through the wall, but not to float outside the case
+            if not any(outline.contains(p) for p in item.points + [item.position]):
+                report['outside'].append(item.describe())
+        elif not outline.contains(item.position):
+            report['outside'].append(item.describe())
+    return report
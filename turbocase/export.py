@@ -0,0 +1,99 @@
+import logging
+import os
+import shutil
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+log = logging.getLogger('export')
+
+# OpenSCAD arguments for the preview image, the same ones update_screenshots.sh uses
+_png_arguments = ['--colorscheme', 'Tomorrow Night', '--imgsize', '930,700', '--viewall', '--autocenter']
+
+
+class Target:
+    """
+    One OpenSCAD invocation, rendering source to output
+    """
+
+    def __init__(self, name, source, output, arguments=None):
+        self.name = name
+        self.source = source
+        self.output = output
+        self.arguments = arguments or []
+
+    def command(self, openscad):
+        return [openscad, '-o', self.output] + self.arguments + [self.source]
+
+
+def find_openscad(path=None):
+    """
+    The OpenSCAD executable to run, the path passed on the command line wins over the OPENSCAD environment variable
+    """
+    if path is None:
+        path = os.environ.get('OPENSCAD', 'openscad')
+    found = shutil.which(path)
+    if found is None:
+        raise FileNotFoundError(f'Could not find the OpenSCAD executable "{path}"')
+    return found
+
+
+def make_targets(stem, names):
+    """
+    The targets for a case written by scad.write_split with this stem
+    """
+    targets = []
+    for name in names:
+        if name == 'case':
+            targets.append(Target('case', f'{stem}_case.scad', f'{stem}_case.stl'))
+        elif name == 'lid':
+            targets.append(Target('lid', f'{stem}_lid.scad', f'{stem}_lid.stl'))
+        elif name == 'png':
+            targets.append(Target('png', f'{stem}_case.scad', f'{stem}.png', _png_arguments))
+        else:
+            raise ValueError(f'Unknown export target "{name}"')
+    return targets
+
+
+def run_target(openscad, target, timeout=None):
+    command = target.command(openscad)
+    log.debug(f'Running {" ".join(command)}')
+    result = {
+        'name': target.name,
+        'output': target.output,
+        'command': command,
+        'returncode': None,
+        'timeout': False,
+        'seconds': 0,
+    }
+    start = time.perf_counter()
+    try:
+        process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout)
+        result['returncode'] = process.returncode
+        if process.returncode != 0:
+            result['stderr'] = process.stderr.decode(errors='replace')[-2000:]
+    except subprocess.TimeoutExpired:
+        # subprocess.run kills the process before raising
+        result['timeout'] = True
+    result['seconds'] = round(time.perf_counter() - start, 3)
+
+    if result['timeout']:
+        log.error(f'{target.name}: timed out after {timeout}s')
+    elif result['returncode'] != 0:
+        log.error(f'{target.name}: OpenSCAD exited with {result["returncode"]}')
+    else:
+        log.info(f'{target.name}: wrote {target.output} in {result["seconds"]:.1f}s')
+    return result
+
+
+def export(openscad, targets, jobs=None, timeout=None):
+    """
+    Run OpenSCAD for all targets with at most jobs processes at the same time. Returns the results in the order of
+    the targets.
+    """
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    jobs = max(1, min(jobs, len(targets)))
+    # The work happens in the OpenSCAD processes, the threads only wait for them
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(lambda target: run_target(openscad, target, timeout), targets))
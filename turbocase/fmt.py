@@ -0,0 +1,12 @@
+def num(value, precision=4):
+    """
+    Format a coordinate with at most precision decimals and without trailing zeros, so floats from the arc math
+    like 123.45678900000001 come out as 123.4568 and 108.0 as 108. The default of 4 decimals is 0.1µm.
+    """
+    # %-formatting is about twice as fast as an f-string with a nested precision and this runs for every point
+    text = '%.*f' % (precision, value)
+    if precision > 0:
+        text = text.rstrip('0').rstrip('.')
+    if text == '-0':
+        return '0'
+    return text
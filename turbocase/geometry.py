@@ -0,0 +1,119 @@
+import math
+
+from turbocase.vector import PointBuffer
+
+
+def _segment_distance(x, y, ax, ay, bx, by):
+    dx = bx - ax
+    dy = by - ay
+    length = math.hypot(dx, dy)
+    if length == 0:
+        # Closed paths start and end on the same point
+        return math.hypot(x - ax, y - ay)
+    return abs(dx * (ay - y) - dy * (ax - x)) / length
+
+
+def path_bounds(path):
+    """
+    The (min_x, min_y, max_x, max_y) bounds of a path, a list of points or a ('circle', center, radius) tuple
+    """
+    if isinstance(path, PointBuffer):
+        return path.bounds()
+    if path[0] == 'circle':
+        center = path[1]
+        radius = path[2]
+        return center[0] - radius, center[1] - radius, center[0] + radius, center[1] + radius
+    return PointBuffer(path).bounds()
+
+
+def segment_point_distance(point, a, b):
+    """
+    Distance from point to the closest point on the line segment from a to b
+    """
+    dx = b[0] - a[0]
+    dy = b[1] - a[1]
+    length = dx * dx + dy * dy
+    t = 0 if length == 0 else max(0, min(1, ((point[0] - a[0]) * dx + (point[1] - a[1]) * dy) / length))
+    return math.hypot(point[0] - a[0] - t * dx, point[1] - a[1] - t * dy)
+
+
+def rotated_rect(position, bounds):
+    """
+    The corners of a footprint-relative rectangle placed at position, rotated like KiCad rotates footprints
+    """
+    angle = math.radians(-position[2] if len(position) > 2 else 0)
+    cos = math.cos(angle)
+    sin = math.sin(angle)
+    result = []
+    for x, y in [(bounds[0], bounds[1]), (bounds[2], bounds[1]), (bounds[2], bounds[3]), (bounds[0], bounds[3])]:
+        result.append((position[0] + x * cos - y * sin, position[1] + x * sin + y * cos))
+    return result
+
+
+def polygon_edges(points):
+    """
+    The (start, end) pairs of the edges of a closed polygon, starting with the closing edge
+    """
+    return [(points[i - 1], points[i]) for i in range(len(points))]
+
+
+def path_point(path):
+    """
+    A point on the outline of a path
+    """
+    if path[0] == 'circle':
+        return path[1][0] + path[2], path[1][1]
+    return path[0]
+
+
+def point_in_path(point, path):
+    """
+    Test if point is inside the closed path with the even-odd rule
+    """
+    x, y = point
+    if path[0] == 'circle':
+        return math.hypot(x - path[1][0], y - path[1][1]) < path[2]
+
+    inside = False
+    px, py = path[-1]
+    for qx, qy in path:
+        if (qy > y) != (py > y) and x < (px - qx) * (y - qy) / (py - qy) + qx:
+            inside = not inside
+        px, py = qx, qy
+    return inside
+
+
+def simplify(path, tolerance):
+    """
+    Remove points from a path with the Ramer-Douglas-Peucker algorithm, the result never deviates more than
+    tolerance from the original path. The first and last point are always kept so closed paths stay closed.
+    """
+    count = len(path)
+    if count < 4 or path[0] == 'circle':
+        return path
+
+    xs = [p[0] for p in path]
+    ys = [p[1] for p in path]
+    keep = [False] * count
+    keep[0] = keep[-1] = True
+    stack = [(0, count - 1)]
+    while stack:
+        first, last = stack.pop()
+        ax, ay, bx, by = xs[first], ys[first], xs[last], ys[last]
+        distance = 0
+        index = first
+        for i in range(first + 1, last):
+            d = _segment_distance(xs[i], ys[i], ax, ay, bx, by)
+            if d > distance:
+                distance = d
+                index = i
+        if distance > tolerance:
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+
+    result = PointBuffer((xs[i], ys[i]) for i in range(count) if keep[i])
+    # Don't collapse tiny shapes into a line
+    if len(result) < 4:
+        return path
+    return result
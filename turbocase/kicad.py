@@ -4,11 +4,16 @@ import logging
 import zlib
 from functools import total_ordering
 import math
+import mmap
+import re
 
 import sexpdata
 
+from turbocase import geometry, sexpr, spatial
 from turbocase.cases import Case, Connector, Part, Mount
-from turbocase.vector import Vector
+from turbocase.tessellate import tessellate_arcs
+from turbocase.vector import PointBuffer, Vector
+import turbocase.cache
 import turbocase.parts
 from turbocase.parts import *
 
@@ -28,16 +33,25 @@ def get_all_parts():
 
 
 class Sym:
+    # Children are only indexed when the symbol is first queried and only wrapped in a Sym when they are
+    # looked up, most of a footprint (pads, graphics, text) is never touched
+    __slots__ = ['raw', 'name', '_attr', '_values', '_property']
+
+    arrays = frozenset(['pad', 'property', 'fp_text', 'fp_line', 'fp_rect', 'fp_circle', 'xy'])
+
     def __init__(self, symbol):
         self.raw = symbol
         self.name = symbol[0].value()
-        self.attr = {}
-        self.values = []
-        self.property = {}
-
-        arrays = ['pad', 'property', 'fp_text', 'fp_line', 'fp_rect', 'fp_circle', 'xy']
-
-        for part in symbol:
+        self._attr = None
+        self._values = None
+        self._property = None
+
+    def _index(self):
+        attr = {}
+        values = []
+        prop = {}
+        arrays = self.arrays
+        for part in self.raw:
             if isinstance(part, sexpdata.Symbol):
                 continue
             if isinstance(part, list):
@@ -45,18 +59,53 @@ class Sym:
 
                 if key == 'property':
                     if len(part) == 2:
-                        self.property[part[1]] = True
+                        prop[part[1]] = True
                     else:
-                        self.property[part[1]] = part[2]
+                        prop[part[1]] = part[2]
 
                 if key in arrays:
-                    if key not in self.attr:
-                        self.attr[key] = []
-                    self.attr[key].append(Sym(part))
+                    if key not in attr:
+                        attr[key] = []
+                    attr[key].append(part)
                 else:
-                    self.attr[key] = Sym(part)
+                    attr[key] = part
             else:
-                self.values.append(part)
+                values.append(part)
+        self._attr = attr
+        self._values = values
+        self._property = prop
+
+    def _wrap(self, key):
+        value = self._attr[key]
+        if isinstance(value, Sym):
+            return value
+        if key in self.arrays:
+            if len(value) == 0 or not isinstance(value[0], Sym):
+                value[:] = [Sym(part) for part in value]
+            return value
+        value = Sym(value)
+        self._attr[key] = value
+        return value
+
+    @property
+    def attr(self):
+        if self._attr is None:
+            self._index()
+        for key in self._attr:
+            self._wrap(key)
+        return self._attr
+
+    @property
+    def values(self):
+        if self._values is None:
+            self._index()
+        return self._values
+
+    @property
+    def property(self):
+        if self._property is None:
+            self._index()
+        return self._property
 
     def __repr__(self):
         values = ' '.join(map(repr, self.values))
@@ -69,10 +118,14 @@ class Sym:
             return self.values[item]
         if isinstance(item, slice):
             return self.values[item.start:item.stop:item.step]
-        return self.attr[item]
+        if self._attr is None:
+            self._index()
+        return self._wrap(item)
 
     def __contains__(self, item):
-        return item in self.attr
+        if self._attr is None:
+            self._index()
+        return item in self._attr
 
     def __len__(self):
         return len(self.values)
@@ -114,7 +167,9 @@ class Shape:
         self.end = ()
         self.point = ()
         self.radius = 0
-        self._bounds = None
+        self._arc_tolerance = None
+        self._path = None
+        self.islands = []
 
     def __repr__(self):
         single = self.parts[0].name in ['gr_rect', 'gr_poly', 'gr_circle']
@@ -124,8 +179,17 @@ class Shape:
 
         return f'<Shape {len(self.parts)} parts>'
 
+    @property
+    def arc_tolerance(self):
+        return self._arc_tolerance
+
+    @arc_tolerance.setter
+    def arc_tolerance(self, value):
+        self._arc_tolerance = value
+        self._path = None
+
     def append(self, graphic):
-        self._bounds = None
+        self._path = None
         self.parts.append(graphic)
 
         if graphic.name == 'gr_circle':
@@ -137,24 +201,30 @@ class Shape:
             end = tuple(graphic['end'][:])
             self.point = (start[0] + end[0]) / 2, (start[1] + end[1]) / 2
 
-    def _degrees(self, r):
-        deg = math.degrees(r) + 90
-        if deg < 0:
-            deg += 360
-        return deg % 360
-
-    def _frange(self, start, stop, step):
-        n_items = int(math.ceil((stop - start) / step))
-        return (start + i * step for i in range(n_items))
-
     def path(self):
+        """
+        The tessellated outline of the shape as a PointBuffer, or ('circle', center, radius) for circles.
+        This is computed once and shared by everything that needs the shape, appending a graphic resets it.
+        """
+        if self._path is None:
+            path = self._make_path()
+            self._path = tuple(path) if path and path[0] == 'circle' else PointBuffer(path)
+        return self._path
+
+    def simplify(self, tolerance):
+        """
+        Replace the path with a simplified one that stays within tolerance from the full path
+        """
+        self._path = geometry.simplify(self.path(), tolerance)
+
+    def _make_path(self):
         single = self.parts[0].name in ['gr_rect', 'gr_poly', 'gr_circle']
         path = []
         if single:
             part = self.parts[0]
             if part.name == 'gr_poly':
                 for xy in part['pts']['xy']:
-                    path.append(xy[:])
+                    path.append(tuple(xy[:]))
                 return path
             if part.name == 'gr_rect':
                 start = tuple(part['start'][:])
@@ -165,7 +235,13 @@ class Shape:
                 path.append((start[0], end[1]))
                 return path
             if part.name == 'gr_circle':
-                return ['circle', self.point, self.radius]
+                return ['circle', tuple(self.point), self.radius]
+
+        arcs = []
+        for item in self.parts:
+            if item.name == 'gr_arc':
+                arcs.append((item['start'][:], item['mid'][:], item['end'][:]))
+        arcs = iter(tessellate_arcs(arcs, self.arc_tolerance))
 
         point = tuple(self.parts[0]['start'][:])
         path.append(point)
@@ -174,64 +250,11 @@ class Shape:
             end = tuple(item['end'][:])
 
             if item.name == 'gr_arc':
-                a = Vector(start[0], start[1])
-                b = Vector(end[0], end[1])
-                mid = Vector(item['mid'][0], item['mid'][1])
-
-                # Figure out the center and radius of the arc
-                v1 = (a + b) / 2 - mid
-                v2 = a - mid
-                cos_ang = (v1 * v2) / (v1.mag() * v2.mag())
-                radius = round((v2.mag() / 2) / cos_ang, 5)
-                c = mid + (v1 / v1.mag()) * radius
-                c = Vector(round(c.x, 5), round(c.y, 5))
-
-                # Calculate new points with the center at 0,0
-                a_c = a - c
-                b_c = b - c
-                m_c = mid - c
-                alpha_a = math.atan2(a_c.y, a_c.x)
-                alpha_b = math.atan2(b_c.y, b_c.x)
-                alpha_m = math.atan2(m_c.y, m_c.x)
-                deg_a = self._degrees(alpha_a)
-                deg_b = self._degrees(alpha_b)
-                deg_m = self._degrees(alpha_m)
-
-                # Swap angles to make them clockwise
-                if deg_a > deg_b:
-                    temp = deg_a
-                    deg_a = deg_b
-                    deg_b = temp
-                    temp = a
-                    a = b
-                    b = temp
-
-                # Swap around direction for big arcs
-                if deg_a < deg_m < deg_b:
-                    pass
-                else:
-                    temp = deg_a
-                    deg_a = deg_b
-                    deg_b = temp
-                    temp = a
-                    a = b
-                    b = temp
-
-                length = (deg_b - deg_a) % 360
-                num_points = int(abs(length) / 9) * max(int(radius / 3), 1)
-
-                newpoints = []
-                step = length / num_points
-                for deg in self._frange(0, length, step):
-                    deg += deg_a
-                    deg %= 360
-                    rad = math.radians(deg - 90)
-                    vec = Vector(round(math.cos(rad), 5), round(math.sin(rad), 5))
-                    newpoints.append((vec * radius) + c)
-                newpoints.append(b)
-
+                newpoints = next(arcs)
                 previous = Vector(point[0], point[1])
-                if (newpoints[0] - previous).mag() < (newpoints[-1] - previous).mag():
+                first = Vector(*newpoints[0]) - previous
+                last = Vector(*newpoints[-1]) - previous
+                if first.mag() < last.mag():
                     path.extend(newpoints[1:])
                 else:
                     path.extend(reversed(newpoints[:-1]))
@@ -247,23 +270,10 @@ class Shape:
         return path
 
     def bounds(self):
-        if self._bounds is not None:
-            return self._bounds
         if self.is_circle:
             c = self.point
-            return c[0] - self.radius, c[0] + self.radius, c[1] - self.radius, c[1] + self.radius
-        coords = self.path()
-        min_x = coords[0][0]
-        max_x = 0
-        min_y = coords[0][1]
-        max_y = 0
-        for point in coords:
-            min_x = min(min_x, point[0])
-            max_x = max(max_x, point[0])
-            min_y = min(min_y, point[1])
-            max_y = max(max_y, point[1])
-        self._bounds = min_x, min_y, max_x, max_y
-        return self._bounds
+            return c[0] - self.radius, c[1] - self.radius, c[0] + self.radius, c[1] + self.radius
+        return geometry.path_bounds(self.path())
 
     @property
     def width(self):
@@ -291,21 +301,70 @@ class Shape:
         return self.area < other.area
 
 
+_tolerance = 0.001
+
+
 def point_match(a, b):
     # Match a coordinate with a margin of error
-    if abs(a[0] - b[0]) < 0.001 and abs(a[1] - b[1]) < 0.001:
+    if abs(a[0] - b[0]) < _tolerance and abs(a[1] - b[1]) < _tolerance:
         return True
     return False
 
 
-def sort_outline(shapes):
+def _grid_cell(point):
+    return math.floor(point[0] / _tolerance), math.floor(point[1] / _tolerance)
+
+
+class EndpointIndex:
+    """
+    Hash grid over the endpoints of line and arc segments. The cells are the size of the point_match
+    tolerance so every possible match is in one of the 9 cells around a point.
+    """
+
+    def __init__(self, segments):
+        self.segments = segments
+        self.endpoints = []
+        self.used = [False] * len(segments)
+        self.grid = {}
+        for i, segment in enumerate(segments):
+            start = tuple(segment['start'][:])
+            end = tuple(segment['end'][:])
+            self.endpoints.append((start, end))
+            for point in (start, end):
+                cell = _grid_cell(point)
+                if cell not in self.grid:
+                    self.grid[cell] = []
+                self.grid[cell].append(i)
+
+    def take(self, i):
+        self.used[i] = True
+        return self.segments[i]
+
+    def find(self, point):
+        """
+        Find the first unused segment with an endpoint matching point, returns the index of the segment and
+        its other endpoint
+        """
+        cx, cy = _grid_cell(point)
+        best = None
+        for x in (cx - 1, cx, cx + 1):
+            for y in (cy - 1, cy, cy + 1):
+                for i in self.grid.get((x, y), ()):
+                    if self.used[i] or (best is not None and i >= best):
+                        continue
+                    if point_match(self.endpoints[i][0], point) or point_match(self.endpoints[i][1], point):
+                        best = i
+        if best is None:
+            return None, None
+        start, end = self.endpoints[best]
+        return best, end if point_match(start, point) else start
+
+
+def sort_outline(shapes, arc_tolerance=None):
     if len(shapes) == 0:
         return []
 
-    # No sorting needed since you can only have one poly as outline
-    if shapes[0].name == 'gr_poly':
-        return [Shape.from_single(shapes[0])]
-
+    log = logging.getLogger('kicad')
     result = []
     unused = []
 
@@ -318,56 +377,173 @@ def sort_outline(shapes):
     if len(unused) == 0:
         return list(sorted(result, reverse=True))
 
-    # Start first shape from seperate parts
-    shape = Shape()
-    shape.point = tuple(unused[0]['end'][:])
-    shape.append(unused[0])
-    del unused[0]
+    # Chain the separate parts into shapes, starting every shape from the first unused part
+    index = EndpointIndex(unused)
+    first = 0
+    while first < len(unused):
+        if index.used[first]:
+            first += 1
+            continue
 
-    while len(unused) > 0:
-        for i, item in enumerate(unused):
-            start = tuple(item['start'][:])
-            end = tuple(item['end'][:])
-            if point_match(start, shape.point):
-                new_point = end
-                break
-            if point_match(end, shape.point):
-                new_point = start
+        shape = Shape()
+        shape.arc_tolerance = arc_tolerance
+        start, shape.point = index.endpoints[first]
+        shape.append(index.take(first))
+        while True:
+            i, new_point = index.find(shape.point)
+            if i is None:
                 break
-        else:
-            # None of the unused parts fit the current shape, start a new shape
-            result.append(shape)
-            shape = Shape()
-            shape.point = tuple(unused[0]['end'][:])
-            shape.append(unused[0])
-            del unused[0]
-            continue
+            shape.point = new_point
+            shape.append(index.take(i))
 
-        shape.point = new_point
-        shape.append(item)
-        del unused[i]
-    result.append(shape)
+        if not point_match(shape.point, start):
+            log.warning(f'Shape with {len(shape.parts)} parts is not closed, it starts at {start[0]}, {start[1]} '
+                        f'and ends at {shape.point[0]}, {shape.point[1]}')
+        result.append(shape)
     return list(sorted(result, reverse=True))
 
 
+def nest_shapes(shapes, outline=False):
+    """
+    Split closed shapes into holes and the islands inside those holes using their containment hierarchy.
+    Islands are attached to the hole around them and only the holes are returned. With outline set the first
+    shape is the outline and the shapes directly inside it are the holes.
+    """
+    log = logging.getLogger('kicad')
+    parents = spatial.containment([shape.path() for shape in shapes])
+    hole_depth = 1 if outline else 0
+    depths = []
+    holes = []
+    for i, shape in enumerate(shapes):
+        shape.islands = []
+        parent = parents[i]
+        depth = 0 if parent is None else depths[parent] + 1
+        depths.append(depth)
+        if outline and i == 0:
+            continue
+        if outline and depth == 0:
+            log.warning(f'{shape} at {shape.bounds()[:2]} is not inside the outline')
+            holes.append(shape)
+        elif depth % 2 == hole_depth:
+            holes.append(shape)
+        else:
+            shapes[parent].islands.append(shape)
+    return holes
+
+
 def shape_bounds(primitives):
     coords = []
     for p in primitives:
         coords.append(p['start'][:])
         coords.append(p['end'][:])
-    min_x = coords[0][0]
-    max_x = 0
-    min_y = coords[0][1]
-    max_y = 0
-    for point in coords:
-        min_x = min(min_x, point[0])
-        max_x = max(max_x, point[0])
-        min_y = min(min_y, point[1])
-        max_y = max(max_y, point[1])
-    return min_x, min_y, max_x, max_y
-
-
-def load_pcb(pcb_file, outline_layer=None, lid_layer=None):
+    return geometry.path_bounds(coords)
+
+
+def footprint_bounds(footprint, layer='F.Fab'):
+    """
+    Bounds of the lines and rectangles of a footprint on a layer relative to the footprint origin, None when the
+    footprint has no graphics on that layer
+    """
+    shapes = []
+    for stype in ['fp_line', 'fp_rect']:
+        if stype in footprint:
+            for line in footprint[stype]:
+                if line['layer'][0] == layer:
+                    shapes.append(line)
+    if len(shapes) == 0:
+        return None
+    return shape_bounds(shapes)
+
+
+_graphics = ['segment', 'gr_line', 'gr_arc', 'gr_poly', 'gr_rect', 'gr_circle']
+# Newer KiCad versions quote the layer name, older ones write it as a bare atom
+_layer_re = re.compile(rb'\(layer\s+(?:"((?:[^"\\]|\\.)*)"|([^\s()]+))')
+
+
+class LayerIndex:
+    """
+    Board graphics bucketed by the layer they are drawn on
+    """
+
+    def __init__(self):
+        self._layers = {}
+
+    def add(self, layer, graphic):
+        if layer not in self._layers:
+            self._layers[layer] = []
+        self._layers[layer].append(graphic)
+
+    def __getitem__(self, layer):
+        return self._layers.get(layer, [])
+
+    def __contains__(self, layer):
+        return layer in self._layers
+
+    def __iter__(self):
+        return iter(self._layers)
+
+    def __len__(self):
+        return len(self._layers)
+
+
+class Board:
+    def __init__(self):
+        self.thickness = 1.6
+        self.layers = LayerIndex()
+        self.footprints = []
+
+
+def read_pcb(pcb_file, layers=None):
+    """
+    Parse the parts of a PCB file that are used for generating the case in a single pass. Graphics are only
+    parsed when they are on one of the requested layers, or on any layer if layers is None. Tracks, vias, zones
+    and nets are skipped entirely. The file is memory mapped so only the blocks that are actually parsed get
+    copied out of it.
+    :rtype: Board
+    """
+    if layers is not None:
+        layers = set(layer.encode() for layer in layers)
+    result = Board()
+    with open(pcb_file, 'rb') as handle:
+        with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for name, start, end in sexpr.forms(data):
+                if name in _graphics:
+                    layer = _layer_re.search(data, start, end)
+                    if layer is None:
+                        continue
+                    layer = layer.group(1) if layer.group(1) is not None else layer.group(2)
+                    if layers is not None and layer not in layers:
+                        continue
+                    graphic = Sym(sexpr.parse(data[start:end].decode()))
+                    result.layers.add(layer.decode(), graphic)
+                elif name == 'footprint':
+                    result.footprints.append(Sym(sexpr.parse(data[start:end].decode())))
+                elif name == 'general':
+                    general = Sym(sexpr.parse(data[start:end].decode()))
+                    result.thickness = general['thickness'][0]
+    return result
+
+
+class _Recorder(logging.Handler):
+    """
+    Collects the warnings and errors logged while extracting a case so they can be stored with the cached result
+    """
+
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append((record.levelno, record.getMessage()))
+
+
+def load_pcb(pcb_file, outline_layer=None, lid_layer=None, cache=False, arc_tolerance=None):
+    """
+    Extract the case information from a KiCad PCB file. With cache enabled the result is stored on disk keyed
+    by the file contents and the layer options so loading the same board again skips the parsing.
+    With arc_tolerance set arcs are tessellated with the minimal number of points that keeps the chords within
+    that distance in mm from the real arc.
+    """
     if outline_layer is None:
         outline_layer = 'User.6'
     if lid_layer is None:
@@ -375,65 +551,76 @@ def load_pcb(pcb_file, outline_layer=None, lid_layer=None):
 
     log = logging.getLogger('kicad')
 
-    with open(pcb_file) as handle:
-        pcb = sexpdata.load(handle)
+    if not cache:
+        board = read_pcb(pcb_file, [outline_layer, lid_layer, 'Edge.Cuts'])
+        return extract_case(board, outline_layer, lid_layer, arc_tolerance)
+
+    key = turbocase.cache.make_key(pcb_file, outline_layer, lid_layer, arc_tolerance)
+    entry = turbocase.cache.load(key)
+    if entry is not None:
+        result, messages = entry
+        log.info(f'Loaded PCB data from cache [{key[:12]}]')
+        # Show the same warnings as the run that filled the cache, the board has the same problems
+        for level, message in messages:
+            log.log(level, message)
+        return result
+
+    recorder = _Recorder()
+    log.addHandler(recorder)
+    try:
+        board = read_pcb(pcb_file, [outline_layer, lid_layer, 'Edge.Cuts'])
+        result = extract_case(board, outline_layer, lid_layer, arc_tolerance)
+    finally:
+        log.removeHandler(recorder)
+
+    turbocase.cache.store(key, (result, recorder.messages))
+    return result
+
+
+def extract_case(board, outline_layer, lid_layer, arc_tolerance=None):
+    """
+    Build the case from a parsed board, the same board can be used to extract cases for multiple outline layers
+    :type board: Board
+    :rtype: Case
+    """
+    log = logging.getLogger('kicad')
 
     result = Case()
+    result.pcb_thickness = board.thickness
+
+    outline_shapes = board.layers[outline_layer]
+    lid_shapes = board.layers[lid_layer]
+    edgecuts_shapes = board.layers['Edge.Cuts']
+    for layer in [outline_layer, lid_layer, 'Edge.Cuts']:
+        for graphic in board.layers[layer]:
+            log.debug(f'[{layer}] {graphic.name}')
 
-    outline_shapes = []
-    lid_shapes = []
-    edgecuts_shapes = []
     mountingholes = []
     connectors = []
     parts = []
     log.debug('Extracting data from PCB file...')
-    for symbol in pcb:
-        if not isinstance(symbol, list):
-            continue
-        if isinstance(symbol[0], sexpdata.Symbol):
-            name = symbol[0].value()
-
-            if name == 'general':
-                general = Sym(symbol)
-                result.pcb_thickness = general['thickness'][0]
-
-            if name in ['segment', 'gr_line', 'gr_arc', 'gr_poly', 'gr_rect', 'gr_circle']:
-                for sub in symbol:
-                    if isinstance(sub, list):
-                        if sub[0].value() == 'layer' and sub[1] == outline_layer:
-                            log.debug(f'[{outline_layer}] {symbol[0]}')
-                            outline_shapes.append(Sym(symbol))
-                        if sub[0].value() == 'layer' and sub[1] == lid_layer:
-                            log.debug(f'[{lid_layer}] {symbol[0]}')
-                            lid_shapes.append(Sym(symbol))
-                        if sub[0].value() == 'layer' and sub[1] == 'Edge.Cuts':
-                            log.debug(f'[Edge.Cuts] {symbol[0]}')
-                            edgecuts_shapes.append(Sym(symbol))
-
-            if name == 'footprint':
-                footprint = Sym(symbol)
-
-                if ':MountingHole_' in footprint[0]:
-                    log.debug(f'Mounting hole detected: {footprint[0]}')
-                    mountingholes.append(footprint)
-                elif 'TurboCase' in footprint[0]:
-                    log.debug(f'TurboCase footprint: {footprint[0]}')
+    for footprint in board.footprints:
+        if ':MountingHole_' in footprint[0]:
+            log.debug(f'Mounting hole detected: {footprint[0]}')
+            mountingholes.append(footprint)
+        elif 'TurboCase' in footprint[0]:
+            log.debug(f'TurboCase footprint: {footprint[0]}')
+            parts.append(footprint)
+        else:
+            for prop in footprint['property']:
+                if len(prop) == 2 and prop[0] == 'Height':
+                    log.debug(f'Part with Height property set: {footprint[0]} is {prop[1]}mm tall')
+                    connectors.append(footprint)
+                if len(prop) == 2 and prop[0] == 'TurboCaseModule':
+                    log.debug(f'Part with embedded OpenSCAD model: {footprint[0]}')
                     parts.append(footprint)
-                else:
-                    for prop in footprint['property']:
-                        if len(prop) == 2 and prop[0] == 'Height':
-                            log.debug(f'Part with Height property set: {footprint[0]} is {prop[1]}mm tall')
-                            connectors.append(footprint)
-                        if len(prop) == 2 and prop[0] == 'TurboCaseModule':
-                            log.debug(f'Part with embedded OpenSCAD model: {footprint[0]}')
-                            parts.append(footprint)
 
     log.debug('Sorting case outline shapes...')
-    outline = sort_outline(outline_shapes)
+    outline = sort_outline(outline_shapes, arc_tolerance)
     log.debug('Sorting edge-cut shapes...')
-    edge_cuts = sort_outline(edgecuts_shapes)
+    edge_cuts = sort_outline(edgecuts_shapes, arc_tolerance)
     log.debug('Sorting lid shapes...')
-    lid = sort_outline(lid_shapes)
+    lid = sort_outline(lid_shapes, arc_tolerance)
 
     if len(outline) == 0:
         log.critical(f'No case outline defined on [{outline_layer}], making rectangular case from [Edge.Cuts]')
@@ -446,15 +633,15 @@ def load_pcb(pcb_file, outline_layer=None, lid_layer=None):
         result.pcb_path = edge_cuts[0].path()
     else:
         log.warning("Could not load a PCB shape from the [Edge.Cuts] layer. No PCB preview will be available.")
-        result.pcb_path = []
+        result.pcb_path = PointBuffer()
     if len(edge_cuts) > 1:
-        result.pcb_holes = edge_cuts[1:]
+        result.pcb_holes = nest_shapes(edge_cuts, outline=True)
 
     result.inner_path = path
     if len(outline) > 1:
-        result.cutouts = outline[1:]
+        result.cutouts = nest_shapes(outline, outline=True)
 
-    result.lid_holes = lid
+    result.lid_holes = nest_shapes(lid)
 
     for hole in mountingholes:
         center = hole['at'][:]
@@ -491,14 +678,8 @@ def load_pcb(pcb_file, outline_layer=None, lid_layer=None):
         height = float(item.property['Height'])
         max_height = max(max_height, height)
 
-        shapes = []
-        for stype in ['fp_line', 'fp_rect']:
-            if stype in item:
-                for line in item[stype]:
-                    if line['layer'][0] == 'F.Fab':
-                        shapes.append(line)
-
-        if len(shapes) == 0:
+        bounds = footprint_bounds(item)
+        if bounds is None:
             log.error(f"Could not process connector {ref}: no graphics on the F.Fab layer found")
             continue
 
@@ -507,7 +688,7 @@ def load_pcb(pcb_file, outline_layer=None, lid_layer=None):
         c.reference = ref
         c.footprint = footprint
         c.description = desc
-        c.bounds = shape_bounds(shapes)
+        c.bounds = bounds
         c.position = item['at'][:]
         if len(c.position) == 2:
             c.position = c.position + [0]
@@ -519,7 +700,9 @@ def load_pcb(pcb_file, outline_layer=None, lid_layer=None):
 
     for part in parts:
         p = Part()
-        p.position = part.attr['at'][:]
+        p.position = part['at'][:]
+        p.reference = part.property['Reference'] if 'Reference' in part.property else None
+        p.bounds = footprint_bounds(part)
         ph = None
         if 'TurboCaseModule' in part.property:
             # Part with embedded OpenSCAD code
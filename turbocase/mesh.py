@@ -0,0 +1,360 @@
+import logging
+import math
+import struct
+import zipfile
+
+from turbocase import offset
+from turbocase.geometry import rotated_rect
+from turbocase.fmt import num
+from turbocase.quality import tiers
+
+try:
+    import numpy
+
+    numpy_support = True
+except ImportError:
+    numpy_support = False
+
+
+class Mesh:
+    """
+    An indexed triangle mesh, triangles are counter-clockwise seen from outside
+    """
+
+    def __init__(self):
+        self.vertices = []
+        self.triangles = []
+
+    def add_vertices(self, points, z):
+        start = len(self.vertices)
+        self.vertices.extend((x, y, z) for x, y in points)
+        return list(range(start, len(self.vertices)))
+
+    def add_cap(self, points, indices, up, hole=None, hole_indices=None):
+        if hole is not None:
+            indices = indices + hole_indices
+        for a, b, c in triangulate(points, hole):
+            a, b, c = indices[a], indices[b], indices[c]
+            self.triangles.append((a, b, c) if up else (a, c, b))
+
+    def add_sides(self, bottom, top, outwards=True):
+        # Quads between two rings of vertices, the rings are counter-clockwise seen from above
+        count = len(bottom)
+        for i in range(count):
+            j = (i + 1) % count
+            if outwards:
+                self.triangles.append((bottom[i], bottom[j], top[j]))
+                self.triangles.append((bottom[i], top[j], top[i]))
+            else:
+                self.triangles.append((bottom[i], top[j], bottom[j]))
+                self.triangles.append((bottom[i], top[i], top[j]))
+
+    def add_prism(self, points, z0, z1):
+        points = _ccw(points)
+        bottom = self.add_vertices(points, z0)
+        top = self.add_vertices(points, z1)
+        self.add_cap(points, bottom, False)
+        self.add_cap(points, top, True)
+        self.add_sides(bottom, top)
+
+    def add_tube(self, center, outer, inner, z0, z1, segments):
+        ring = [(math.cos(2 * math.pi * i / segments), math.sin(2 * math.pi * i / segments)) for i in range(segments)]
+        rings = []
+        for radius in (outer, inner):
+            points = [(center[0] + x * radius, center[1] + y * radius) for x, y in ring]
+            rings.append((self.add_vertices(points, z0), self.add_vertices(points, z1)))
+        (outer_bottom, outer_top), (inner_bottom, inner_top) = rings
+        self.add_sides(outer_bottom, outer_top)
+        self.add_sides(inner_bottom, inner_top, outwards=False)
+        # The two circles have the same number of segments, so the caps are a strip of quads
+        self.add_sides(outer_top, inner_top)
+        self.add_sides(inner_bottom, outer_bottom)
+
+
+def _signed_area(points):
+    area = 0
+    px, py = points[-1]
+    for x, y in points:
+        area += px * y - x * py
+        px, py = x, y
+    return area / 2
+
+
+def _ccw(points):
+    if _signed_area(points) < 0:
+        return points[::-1]
+    return points
+
+
+def _cross(a, b, c):
+    return (b[0] - a[0]) * (c[1] - a[1]) - (b[1] - a[1]) * (c[0] - a[0])
+
+
+def _in_triangle(p, a, b, c):
+    return _cross(a, b, p) >= 0 and _cross(b, c, p) >= 0 and _cross(c, a, p) >= 0
+
+
+def _bridge(outer, hole):
+    """
+    Join a clockwise hole to a counter-clockwise outline with a zero width cut, so the result can be triangulated as
+    one polygon. Returns the positions of the joined polygon in outer + hole.
+    """
+    count = len(outer)
+    m = max(range(len(hole)), key=lambda i: hole[i][0])
+    mx, my = hole[m]
+
+    # Closest outline edge to the right of the rightmost hole point
+    best = None
+    for i in range(count):
+        a = outer[i]
+        b = outer[(i + 1) % count]
+        if (a[1] > my) == (b[1] > my) or a[1] == b[1]:
+            continue
+        x = a[0] + (my - a[1]) * (b[0] - a[0]) / (b[1] - a[1])
+        if x >= mx and (best is None or x < best[0]):
+            best = x, i
+    if best is None:
+        raise ValueError('Hole is not inside the outline')
+    x, i = best
+    p = i if outer[i][0] > outer[(i + 1) % count][0] else (i + 1) % count
+
+    # An outline vertex that sticks into the triangle between the hole and p would block the cut, take the one with
+    # the smallest angle to the ray instead
+    ray = (mx, my), (x, my), outer[p]
+    if _cross(*ray) < 0:
+        ray = (mx, my), outer[p], (x, my)
+    best_angle = None
+    for k in range(count):
+        if k == p:
+            continue
+        point = outer[k]
+        if point == outer[p] or _cross(outer[k - 1], point, outer[(k + 1) % count]) >= 0:
+            continue
+        if _in_triangle(point, *ray):
+            angle = abs(math.atan2(point[1] - my, point[0] - mx)), math.hypot(point[0] - mx, point[1] - my)
+            if best_angle is None or angle < best_angle:
+                best_angle = angle
+                p = k
+
+    hole_positions = [count + (m + k) % len(hole) for k in range(len(hole) + 1)]
+    return list(range(p + 1)) + hole_positions + list(range(p, count))
+
+
+def triangulate(points, hole=None):
+    """
+    Ear clipping triangulation of a counter-clockwise simple polygon, optionally with one clockwise hole. Returns
+    triangles as positions in points + hole.
+    """
+    if hole is not None:
+        order = _bridge(points, hole)
+        points = points + hole
+    else:
+        order = list(range(len(points)))
+
+    count = len(order)
+    previous = [(i - 1) % count for i in range(count)]
+    following = [(i + 1) % count for i in range(count)]
+
+    def corner(i):
+        return _cross(points[order[previous[i]]], points[order[i]], points[order[following[i]]])
+
+    # Only vertices that don't point outwards can be inside an ear, so only those have to be tested
+    reflex = set(i for i in range(count) if corner(i) <= 0)
+
+    def is_ear(i):
+        if i in reflex:
+            return False
+        a = points[order[previous[i]]]
+        b = points[order[i]]
+        c = points[order[following[i]]]
+        for k in reflex:
+            point = points[order[k]]
+            if point == a or point == b or point == c:
+                continue
+            if _in_triangle(point, a, b, c):
+                return False
+        return True
+
+    result = []
+    remaining = count
+    i = 0
+    stuck = 0
+    while remaining > 3:
+        if is_ear(i) or stuck > remaining:
+            # Give up on finding a proper ear for broken input instead of looping forever
+            p = previous[i]
+            n = following[i]
+            result.append((order[p], order[i], order[n]))
+            following[p] = n
+            previous[n] = p
+            reflex.discard(i)
+            remaining -= 1
+            stuck = 0
+            for k in (p, n):
+                if corner(k) <= 0:
+                    reflex.add(k)
+                else:
+                    reflex.discard(k)
+            i = n
+        else:
+            stuck += 1
+            i = following[i]
+    result.append((order[previous[i]], order[i], order[following[i]]))
+    return result
+
+
+def _path_points(path, fa, fs):
+    if len(path) == 0:
+        return []
+    if path[0] == 'circle':
+        (x, y), r = path[1], path[2]
+        segments = offset.fragments(r, fa, fs)
+        return [(x + r * math.cos(2 * math.pi * i / segments), y + r * math.sin(2 * math.pi * i / segments))
+                for i in range(segments)]
+    return offset.clean_path(path)
+
+
+def build(case):
+    """
+    Build an approximate mesh of the case without the lid: the floor and walls around the inner outline, the
+    standoffs and boxes for the connectors and parts. Cutouts and the part geometry from the footprint libraries
+    are left out. The coordinates match the OpenSCAD output.
+    :type case: Case
+    """
+    log = logging.getLogger('mesh')
+    center = case.get_center()
+
+    def transform(points):
+        # Same as the translate and scale around the case in the generated OpenSCAD file
+        return [(x - center[0], center[1] - y) for x, y in points]
+
+    headroom = max(case.max_connector_height, case.max_part_height - case.standoff_height - case.pcb_thickness)
+    inner_height = case.floor_thickness + case.standoff_height + case.pcb_thickness + headroom
+    height = case.floor_thickness + inner_height
+    pcb_top = case.floor_thickness + case.standoff_height + case.pcb_thickness
+
+    tier = tiers[case.quality]
+    mesh = Mesh()
+    inner = _path_points(case.inner_path, tier['fa'], tier['fs'])
+    outer = offset.offset_polygon(inner, case.wall_thickness, tier['fa'], tier['fs']) if len(inner) >= 3 else None
+    if outer is None:
+        log.error('Could not calculate the outside of the case wall, the mesh only has the floor')
+        if len(inner) >= 3:
+            mesh.add_prism(transform(inner), 0, case.floor_thickness)
+    else:
+        inner = _ccw(transform(inner))
+        outer = _ccw(transform(list(outer)))
+        outer_bottom = mesh.add_vertices(outer, 0)
+        outer_top = mesh.add_vertices(outer, height)
+        inner_bottom = mesh.add_vertices(inner, case.floor_thickness)
+        inner_top = mesh.add_vertices(inner, height)
+        mesh.add_cap(outer, outer_bottom, False)
+        mesh.add_sides(outer_bottom, outer_top)
+        mesh.add_cap(outer, outer_top, True, inner[::-1], inner_top[::-1])
+        mesh.add_sides(inner_bottom, inner_top, outwards=False)
+        mesh.add_cap(inner, inner_bottom, True)
+
+    for mount in case.pcb_mount:
+        position = transform([mount.position])[0]
+        # Same number of segments as the mount() in the OpenSCAD file
+        segments = tier['circle_fn'] or offset.fragments(mount.size / 2, tier['fa'], tier['fs'])
+        mesh.add_tube(position, mount.size / 2, mount.drill / 2, case.floor_thickness,
+                      case.floor_thickness + case.standoff_height, segments)
+
+    for connector in case.connectors:
+        corners = transform(rotated_rect(connector.position, connector.bounds))
+        mesh.add_prism(corners, pcb_top, pcb_top + connector.prop_height)
+
+    for part in case.parts:
+        if part.bounds is None or part.add is None:
+            continue
+        # The real height of a part isn't known without OpenSCAD, let it fill the case
+        z = pcb_top if part.offset_pcb else case.floor_thickness
+        mesh.add_prism(transform(rotated_rect(part.position, part.bounds)), z, height)
+
+    return mesh
+
+
+def _normals(mesh):
+    result = []
+    vertices = mesh.vertices
+    for a, b, c in mesh.triangles:
+        a, b, c = vertices[a], vertices[b], vertices[c]
+        u = b[0] - a[0], b[1] - a[1], b[2] - a[2]
+        v = c[0] - a[0], c[1] - a[1], c[2] - a[2]
+        n = u[1] * v[2] - u[2] * v[1], u[2] * v[0] - u[0] * v[2], u[0] * v[1] - u[1] * v[0]
+        length = math.sqrt(n[0] * n[0] + n[1] * n[1] + n[2] * n[2]) or 1
+        result.append((n[0] / length, n[1] / length, n[2] / length))
+    return result
+
+
+def _stl_body_numpy(mesh):
+    vertices = numpy.array(mesh.vertices, dtype=numpy.float64).reshape(-1, 3)
+    triangles = vertices[numpy.array(mesh.triangles, dtype=numpy.int64).reshape(-1, 3)]
+    normals = numpy.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    lengths = numpy.linalg.norm(normals, axis=1)
+    lengths[lengths == 0] = 1
+    records = numpy.zeros(len(triangles), dtype=[('normal', '<f4', 3), ('points', '<f4', (3, 3)), ('attr', '<u2')])
+    records['normal'] = normals / lengths[:, None]
+    records['points'] = triangles
+    return records.tobytes()
+
+
+def _stl_body(mesh):
+    record = struct.Struct('<12fH')
+    body = bytearray(record.size * len(mesh.triangles))
+    vertices = mesh.vertices
+    for i, (triangle, normal) in enumerate(zip(mesh.triangles, _normals(mesh))):
+        record.pack_into(body, i * record.size, *normal, *vertices[triangle[0]], *vertices[triangle[1]],
+                         *vertices[triangle[2]], 0)
+    return bytes(body)
+
+
+def write_stl(mesh, handle):
+    """
+    Write the mesh as binary STL to a file opened in binary mode
+    """
+    handle.write(b'turbocase preview'.ljust(80, b' '))
+    handle.write(struct.pack('<I', len(mesh.triangles)))
+    if numpy_support and mesh.triangles:
+        handle.write(_stl_body_numpy(mesh))
+    else:
+        handle.write(_stl_body(mesh))
+
+
+_3mf_content_types = """<?xml version="1.0" encoding="UTF-8"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+  <Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+  <Default Extension="model" ContentType="application/vnd.ms-package.3dmanufacturing-3dmodel+xml"/>
+</Types>
+"""
+
+_3mf_rels = """<?xml version="1.0" encoding="UTF-8"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+  <Relationship Target="/3D/3dmodel.model" Id="rel0"
+                Type="http://schemas.microsoft.com/3dmanufacturing/2013/01/3dmodel"/>
+</Relationships>
+"""
+
+
+def _3mf_model(mesh, precision):
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    yield '<model unit="millimeter" xmlns="http://schemas.microsoft.com/3dmanufacturing/core/2015/02">\n'
+    yield '<resources><object id="1" type="model"><mesh><vertices>\n'
+    for x, y, z in mesh.vertices:
+        yield f'<vertex x="{num(x, precision)}" y="{num(y, precision)}" z="{num(z, precision)}"/>\n'
+    yield '</vertices><triangles>\n'
+    for a, b, c in mesh.triangles:
+        yield f'<triangle v1="{a}" v2="{b}" v3="{c}"/>\n'
+    yield '</triangles></mesh></object></resources>\n'
+    yield '<build><item objectid="1"/></build>\n'
+    yield '</model>\n'
+
+
+def write_3mf(mesh, path, precision=4):
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', _3mf_content_types)
+        archive.writestr('_rels/.rels', _3mf_rels)
+        with archive.open('3D/3dmodel.model', 'w') as handle:
+            for chunk in _3mf_model(mesh, precision):
+                handle.write(chunk.encode())
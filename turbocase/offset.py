@@ -0,0 +1,177 @@
+import math
+
+from turbocase import geometry, spatial
+from turbocase.vector import PointBuffer
+
+
+def fragments(radius, fa=4, fs=0.2):
+    """
+    The number of segments OpenSCAD splits a circle with this radius into for these $fa and $fs
+    """
+    return max(math.ceil(max(min(360 / fa, radius * 2 * math.pi / fs), 5)), 3)
+
+
+def clean_path(path):
+    """
+    The points of a closed path as a list without repeated points, the closing point and points in the middle of
+    straight lines
+    """
+    points = []
+    for point in path:
+        if not points or abs(point[0] - points[-1][0]) > 1e-9 or abs(point[1] - points[-1][1]) > 1e-9:
+            points.append((point[0], point[1]))
+    while len(points) > 1 and abs(points[0][0] - points[-1][0]) <= 1e-9 and abs(points[0][1] - points[-1][1]) <= 1e-9:
+        points.pop()
+
+    def straight(a, b, c):
+        cross = (b[0] - a[0]) * (c[1] - b[1]) - (b[1] - a[1]) * (c[0] - b[0])
+        dot = (b[0] - a[0]) * (c[0] - b[0]) + (b[1] - a[1]) * (c[1] - b[1])
+        return abs(cross) < 1e-12 and dot > 0
+
+    result = []
+    for point in points:
+        while len(result) >= 2 and straight(result[-2], result[-1], point):
+            result.pop()
+        result.append(point)
+    while len(result) >= 3 and straight(result[-2], result[-1], result[0]):
+        result.pop()
+    while len(result) >= 3 and straight(result[-1], result[0], result[1]):
+        result.pop(0)
+    return result
+
+
+def _signed_area(points):
+    area = 0
+    px, py = points[-1]
+    for x, y in points:
+        area += px * y - x * py
+        px, py = x, y
+    return area / 2
+
+
+def _at_distance(points, result, distance, tolerance=1e-6):
+    # Every vertex of a correct offset is exactly distance away from the original outline. Removing collapsed edges
+    # one at a time can join offset lines that never meet in the real offset, which gives vertices that are too
+    # close or too far from some other part of a concave outline without making the result self intersecting.
+    count = len(points)
+    edges = [(points[i], points[(i + 1) % count]) for i in range(count)]
+    lengths = sorted(max(abs(b[0] - a[0]), abs(b[1] - a[1])) for a, b in edges)
+    index = spatial.GridIndex(lengths[count // 2] or 1)
+    for i, (a, b) in enumerate(edges):
+        index.insert(i, (min(a[0], b[0]), min(a[1], b[1]), max(a[0], b[0]), max(a[1], b[1])))
+
+    reach = abs(distance) + tolerance
+    for point in result:
+        nearest = math.inf
+        for i in index.query((point[0] - reach, point[1] - reach, point[0] + reach, point[1] + reach)):
+            nearest = min(nearest, geometry.segment_point_distance(point, edges[i][0], edges[i][1]))
+        if abs(nearest - abs(distance)) > tolerance:
+            return False
+    return True
+
+
+def offset_polygon(path, distance, fa=4, fs=0.2):
+    """
+    Offset a simple closed polygon like OpenSCAD's offset(r=distance) does: corners that grow get rounded, corners
+    that shrink stay sharp and edges that disappear in the offset are dropped. The rounded corners use the same
+    number of segments as OpenSCAD with these $fa and $fs. Returns None when the result can't be calculated as a
+    single simple polygon, like when an inset splits the shape in two. The caller should let OpenSCAD do those.
+    """
+    points = clean_path(path)
+    if len(points) < 3:
+        return None
+    if _signed_area(points) < 0:
+        points.reverse()
+
+    count = len(points)
+    edges = []
+    anchors = []
+    for i in range(count):
+        a = points[i]
+        b = points[(i + 1) % count]
+        length = math.hypot(b[0] - a[0], b[1] - a[1])
+        e = (b[0] - a[0]) / length, (b[1] - a[1]) / length
+        edges.append(e)
+        # A point on the offset line of this edge, the normal points outwards for counter-clockwise polygons
+        anchors.append((a[0] + e[1] * distance, a[1] - e[0] * distance))
+
+    segments = fragments(abs(distance), fa, fs)
+
+    def corner(p, k):
+        # The points between the offset lines of edge p and the edge k following it
+        e1 = edges[p]
+        e2 = edges[k]
+        cross = e1[0] * e2[1] - e1[1] * e2[0]
+        dot = e1[0] * e2[0] + e1[1] * e2[1]
+        neighbours = (p + 1) % count == k
+        if (cross > 0) == (distance > 0):
+            if not neighbours:
+                return None
+            # The corner grows, round it with an arc around the original vertex
+            x, y = points[k]
+            turn = math.atan2(cross, dot)
+            start = math.atan2(-e1[0] * distance, e1[1] * distance)
+            steps = max(math.ceil(abs(turn) / (2 * math.pi) * segments), 1)
+            result = []
+            for step in range(steps + 1):
+                angle = start + turn * step / steps
+                result.append((x + abs(distance) * math.cos(angle), y + abs(distance) * math.sin(angle)))
+            return result
+
+        # The corner shrinks, this is where the two offset lines cross
+        if abs(cross) < 1e-9:
+            return None
+        a = anchors[p]
+        b = anchors[k]
+        t = ((b[0] - a[0]) * e2[1] - (b[1] - a[1]) * e2[0]) / cross
+        return [(a[0] + e1[0] * t, a[1] + e1[1] * t)]
+
+    previous = [(i - 1) % count for i in range(count)]
+    following = [(i + 1) % count for i in range(count)]
+    corners = []
+    for i in range(count):
+        c = corner(previous[i], i)
+        if c is None:
+            return None
+        corners.append(c)
+
+    def flipped(k):
+        a = corners[k][-1]
+        b = corners[following[k]][0]
+        return (b[0] - a[0]) * edges[k][0] + (b[1] - a[1]) * edges[k][1] < 0
+
+    # Edges that point backwards after the offset have collapsed, remove them and join their neighbours. This turns
+    # an inset of a rounded corner with a smaller radius than the inset into a sharp corner like OpenSCAD does.
+    removed = [False] * count
+    remaining = count
+    work = list(range(count))
+    while work:
+        k = work.pop()
+        if removed[k] or not flipped(k):
+            continue
+        removed[k] = True
+        remaining -= 1
+        if remaining < 3:
+            return None
+        p = previous[k]
+        q = following[k]
+        following[p] = q
+        previous[q] = p
+        corners[q] = corner(p, q)
+        if corners[q] is None:
+            return None
+        work.append(p)
+        work.append(q)
+
+    first = removed.index(False)
+    result = []
+    k = first
+    while True:
+        result.extend(corners[k])
+        k = following[k]
+        if k == first:
+            break
+
+    if spatial.self_intersects(result) or not _at_distance(points, result, distance):
+        return None
+    return PointBuffer(result)
@@ -0,0 +1,28 @@
+# Facet settings for OpenSCAD together with the density turbocase uses for the arcs it tessellates itself.
+# preview_fa is used for the OpenSCAD preview. circle_fn fixes the number of segments of every round feature that
+# is written as a circle or cylinder, the standoffs, inserts, round PCB holes and round cutouts and lid holes
+# whatever their size, instead of deriving it from $fa and $fs. Only draft sets it, a fixed count would make the
+# bigger features of the other tiers coarser than $fa and $fs make them.
+tiers = {
+    'draft': {
+        'preview_fa': 12,
+        'fa': 12,
+        'fs': 1,
+        'arc_tolerance': 0.1,
+        'circle_fn': 12,
+    },
+    'normal': {
+        'preview_fa': 10,
+        'fa': 4,
+        'fs': 0.2,
+        'arc_tolerance': None,
+        'circle_fn': None,
+    },
+    'final': {
+        'preview_fa': 10,
+        'fa': 2,
+        'fs': 0.1,
+        'arc_tolerance': 0.005,
+        'circle_fn': None,
+    },
+}
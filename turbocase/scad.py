@@ -1,4 +1,12 @@
+import hashlib
 import logging
+import os
+
+from turbocase import geometry, spatial
+from turbocase.fmt import num
+from turbocase.offset import offset_polygon
+from turbocase.quality import tiers
+from turbocase.vector import PointBuffer
 
 _template = """
 module wall (thickness, height) {
@@ -77,210 +85,436 @@ def esc(inp):
     return inp.replace('.', '_')
 
 
-def _make_scad_polygon(points, label):
+def _fn(case):
+    # Extra argument for the small round features when the quality tier fixes their number of segments
+    fn = tiers[case.quality]['circle_fn']
+    return f', $fn={fn}' if fn else ''
+
+
+def _make_scad_polygon(points, label, precision):
     if len(points) == 0:
         log = logging.getLogger('scad')
         log.error(f'Shape "{label}" had no points')
-        return 'circle();'
+        yield 'circle();'
+        return
 
     if points[0] == 'circle':
-        return f'translate([{points[1][0]}, {points[1][0]}, 0]) circle(r={points[2]});'
-
-    result = 'polygon(points = ['
-    parts = []
+        yield f'translate([{num(points[1][0], precision)}, {num(points[1][1], precision)}, 0]) ' \
+              f'circle(r={num(points[2], precision)});'
+        return
+
+    # Big outlines are formatted in batches so they never have to be in memory as one string
+    yield 'polygon(points = ['
+    separator = ''
+    batch = []
     for p in points:
-        parts.append(f'[{p[0]},{p[1]}]')
-    result += ', '.join(parts)
-    result += ']);\n'
-    return result
+        batch.append(f'[{num(p[0], precision)},{num(p[1], precision)}]')
+        if len(batch) == 1024:
+            yield separator + ', '.join(batch)
+            separator = ', '
+            batch = []
+    if batch:
+        yield separator + ', '.join(batch)
+    yield ']);\n'
+
+
+def _make_scad_polygon_line(points, label, precision):
+    # A polygon that always ends with exactly one newline
+    last = ''
+    for chunk in _make_scad_polygon(points, label, precision):
+        if last:
+            yield last
+        last = chunk
+    yield last.rstrip() + '\n'
+
+
+def _relative_path(path, origin):
+    if origin is None:
+        return path
+    if path[0] == 'circle':
+        return 'circle', (path[1][0] - origin[0], path[1][1] - origin[1]), path[2]
+    return PointBuffer((x - origin[0], y - origin[1]) for x, y in path)
+
+
+def _make_scad_shape(shape, label, precision, origin=None):
+    path = _relative_path(shape.path(), origin)
+    if len(shape.islands) == 0:
+        yield from _make_scad_polygon(path, label, precision)
+        return
+
+    yield 'difference() {\n'
+    yield '            '
+    yield from _make_scad_polygon_line(path, label, precision)
+    for island in shape.islands:
+        yield '            '
+        yield from _make_scad_polygon_line(_relative_path(island.path(), origin), f'{label} island', precision)
+    yield '        }\n'
+
+
+def _shape_key(shape, origin):
+    key = []
+    for path in [shape.path()] + [island.path() for island in shape.islands]:
+        path = _relative_path(path, origin)
+        if path[0] == 'circle':
+            key.append(('circle', round(path[1][0], 6), round(path[1][1], 6), round(path[2], 6)))
+        else:
+            key.append(tuple((round(x, 6), round(y, 6)) for x, y in path))
+    return tuple(key)
 
 
-def _make_pcb_module(case):
-    result = 'module pcb() {\n'
-    result += f'    thickness = {case.pcb_thickness};\n\n'
-    result += '    color("#009900")\n'
-    result += '    difference() {\n'
-    result += f'        linear_extrude(thickness) ' + '{\n'
-    result += '            ' + _make_scad_polygon(case.pcb_path, 'edge.cuts')
-    result += '        }\n'
+def _find_shared_shapes(case):
+    """
+    Find polygon holes that appear more than once with the same shape, these are emitted once as a module and placed
+    with translate. Returns the module name and the placement for every shared shape by id and the module list.
+    """
+    groups = {}
+    for shape in case.pcb_holes + case.cutouts + case.lid_holes:
+        if (shape.is_circle or shape.is_rect) and not shape.islands:
+            continue
+        bounds = shape.bounds()
+        origin = bounds[0], bounds[1]
+        key = _shape_key(shape, origin)
+        if key not in groups:
+            groups[key] = []
+        groups[key].append((shape, origin))
+
+    placements = {}
+    modules = []
+    for group in groups.values():
+        if len(group) < 2:
+            continue
+        name = f'shared_shape_{len(modules) + 1}'
+        modules.append((name, group[0][0], group[0][1]))
+        for shape, origin in group:
+            placements[id(shape)] = name, origin
+    return placements, modules
+
+
+def _make_shared_modules(modules, precision):
+    for name, shape, origin in modules:
+        yield f'module {name}() ' + '{\n'
+        yield '    '
+        yield from _make_scad_shape(shape, name, precision, origin)
+        yield '}\n\n'
+
+
+def _make_shape_placement(shape, z, extrude, label, shared, precision):
+    if id(shape) in shared:
+        name, origin = shared[id(shape)]
+        yield f'    translate([{num(origin[0], precision)}, {num(origin[1], precision)}, {z}])\n'
+        yield f'    {extrude}\n'
+        yield f'        {name}();\n\n'
+        return
+
+    yield f'    translate([0, 0, {z}])\n'
+    yield f'    {extrude}\n'
+    yield '        '
+    yield from _make_scad_shape(shape, label, precision)
+    yield '\n'
+
+
+def _make_pcb_module(case, shared):
+    precision = case.precision
+    yield 'module pcb() {\n'
+    yield f'    thickness = {case.pcb_thickness};\n\n'
+    yield '    color("#009900")\n'
+    yield '    difference() {\n'
+    yield f'        linear_extrude(thickness) ' + '{\n'
+    yield '            '
+    yield from _make_scad_polygon(case.pcb_path, 'edge.cuts', precision)
+    yield '        }\n'
     for shape in case.pcb_holes:
-        if shape.is_circle:
-            result += f'    translate([{shape.point[0]}, {shape.point[1]}, -1])\n'
-            result += f'        cylinder(thickness+2, {shape.radius}, {shape.radius});\n'
-        elif shape.is_rect:
-            result += f'    translate([{shape.point[0]}, {shape.point[1]}, 0])\n'
-            result += f'        cube([{shape.width}, {shape.height}, thickness + 2], center=true);\n'
+        if shape.is_circle and not shape.islands:
+            yield f'    translate([{num(shape.point[0], precision)}, {num(shape.point[1], precision)}, -1])\n'
+            radius = num(shape.radius, precision)
+            yield f'        cylinder(thickness+2, {radius}, {radius}{_fn(case)});\n'
+        elif shape.is_rect and not shape.islands:
+            yield f'    translate([{num(shape.point[0], precision)}, {num(shape.point[1], precision)}, 0])\n'
+            yield f'        cube([{num(shape.width, precision)}, {num(shape.height, precision)}, thickness + 2], ' \
+                  f'center=true);\n'
         else:
-            result += f'    translate([0, 0, -1])\n'
-            result += f'    linear_extrude(thickness+2) \n'
-            result += f'        {_make_scad_polygon(shape.path(), "pcb hole")}\n'
-    result += '    }\n'
-    result += '}\n\n'
-    return result
+            yield from _make_shape_placement(shape, '-1', 'linear_extrude(thickness+2) ', 'pcb hole', shared, precision)
+    yield '    }\n'
+    yield '}\n\n'
 
 
 def _make_outline_module(case):
-    result = 'module case_outline() {\n'
-    result += '    ' + _make_scad_polygon(case.inner_path, 'case outline')
-    result += '}\n\n'
-    return result
+    yield 'module case_outline() {\n'
+    yield '    '
+    yield from _make_scad_polygon(case.inner_path, 'case outline', case.precision)
+    yield '}\n\n'
+
+
+def _make_offset_module(case):
+    # The offsets the box and lid modules need for the current dimensions are calculated here once, any other value
+    # from the customizer is still done by OpenSCAD
+    log = logging.getLogger('scad')
+    tier = tiers[case.quality]
+    precision = case.precision
+    path = case.inner_path
+    branches = []
+    for r in (case.wall_thickness, -0.2, -1.2):
+        if r in [b[0] for b in branches]:
+            continue
+        if path[0] == 'circle':
+            if path[2] + r <= 0:
+                continue
+            code = f'translate([{num(path[1][0], precision)}, {num(path[1][1], precision)}, 0]) ' \
+                   f'circle(r={num(path[2] + r, precision)});\n'
+        else:
+            points = offset_polygon(path, r, tier['fa'], tier['fs'])
+            if points is None:
+                log.warning(f'Could not calculate the case outline offset by {r}mm, leaving it to OpenSCAD')
+                continue
+            code = ''.join(_make_scad_polygon(points, f'case outline offset {r}', precision))
+        branches.append((r, code))
+
+    yield 'module outline_offset(r) {\n    '
+    for r, code in branches:
+        yield f'if (r == {r}) ' + '{\n'
+        yield f'        {code}'
+        yield '    } else '
+    yield '{\n'
+    yield '        offset(r=r)\n'
+    yield '            children();\n'
+    yield '    }\n'
+    yield '}\n\n'
 
 
 def _make_insert_parameters(insert):
-    result = f'/* [{insert[0]} screws] */\n'
-    result += '// Outer diameter for the insert\n'
+    yield f'/* [{insert[0]} screws] */\n'
+    yield '// Outer diameter for the insert\n'
     # 0.77 is added partially as a sane-ish default, but also to force OpenSCAD to allow 2 positions of floating point
     # precision in the customizer for this value
-    result += f'insert_{esc(insert[0])}_diameter = {insert[1] + 0.77};\n'
-    result += '// Depth of the insert\n'
-    result += f'insert_{esc(insert[0])}_depth = {insert[1] * 1.5};\n'
-    result += '\n'
-    return result
+    yield f'insert_{esc(insert[0])}_diameter = {insert[1] + 0.77};\n'
+    yield '// Depth of the insert\n'
+    yield f'insert_{esc(insert[0])}_depth = {insert[1] * 1.5};\n'
+    yield '\n'
 
 
-def _make_insert_module(insert):
+def _make_insert_module(insert, csg='flat', fn=''):
     insert = esc(insert)
-    result = f'module Insert_{insert}() ' + '{\n'
-    result += f'    translate([0, 0, -insert_{insert}_depth])\n'
-    result += f'        cylinder(insert_{insert}_depth, insert_{insert}_diameter/2, insert_{insert}_diameter/2);\n'
+    yield f'module Insert_{insert}() ' + '{\n'
+    indent = '    '
+    if csg == 'grouped':
+        yield '    render() {\n'
+        indent = '        '
+    yield f'{indent}translate([0, 0, -insert_{insert}_depth])\n'
+    yield f'{indent}    cylinder(insert_{insert}_depth, insert_{insert}_diameter/2, insert_{insert}_diameter/2{fn});\n'
 
-    result += f'    translate([0, 0, -0.3])\n'
-    result += f'        cylinder(0.3, insert_{insert}_diameter/2, insert_{insert}_diameter/2+0.3);\n'
+    yield f'{indent}translate([0, 0, -0.3])\n'
+    yield f'{indent}    cylinder(0.3, insert_{insert}_diameter/2, insert_{insert}_diameter/2+0.3{fn});\n'
 
-    result += '}\n\n'
-    return result
+    if csg == 'grouped':
+        yield '    }\n'
+    yield '}\n\n'
 
 
-def _make_part(part, indent, substract=False, lid=False):
+def _make_part(part, indent, precision, substract=False, lid=False):
     s = 'Substract: ' if substract else ''
-    result = f'{indent}// {s}{part.description}\n'
+    yield f'{indent}// {s}{part.description}\n'
     z = 'floor_height'
     if part.offset_pcb:
         z = 'pcb_top'
-    result += f'{indent}translate([{part.position[0]}, {part.position[1]}, {z}])\n'
+    yield f'{indent}translate([{num(part.position[0], precision)}, {num(part.position[1], precision)}, {z}])\n'
     if len(part.position) == 3:
-        result += f'{indent}rotate([0, 0, {-part.position[2]}])\n'
+        yield f'{indent}rotate([0, 0, {num(-part.position[2], precision)}])\n'
     if substract:
-        result += f'{indent}    {part.substract};\n\n'
+        yield f'{indent}    {part.substract};\n\n'
     elif lid:
-        result += f'{indent}    {part.lid};\n\n'
+        yield f'{indent}    {part.lid};\n\n'
     else:
         if part.insert_module:
-            result += f'{indent}    {part.add}\n'
-            result += f'{indent}        Insert_{part.insert_module[0]}();\n\n'
+            yield f'{indent}    {part.add}\n'
+            yield f'{indent}        Insert_{part.insert_module[0]}();\n\n'
         else:
-            result += f'{indent}    {part.add};\n\n'
+            yield f'{indent}    {part.add};\n\n'
+
+
+def _make_cutout(shape, shared, precision, fn=''):
+    if shape.is_circle and not shape.islands:
+        yield f'    translate([{num(shape.point[0], precision)}, {num(shape.point[1], precision)}, -1])\n'
+        radius = num(shape.radius, precision)
+        yield f'        #cylinder(floor_height+2, {radius}, {radius}{fn});\n'
+    elif shape.is_rect and not shape.islands:
+        yield f'    translate([{num(shape.point[0], precision)}, {num(shape.point[1], precision)}, 0])\n'
+        yield f'        #cube([{num(shape.width, precision)}, {num(shape.height, precision)}, floor_height + 2], ' \
+              f'center=true);\n'
+    else:
+        yield from _make_shape_placement(shape, '-1', '#linear_extrude(floor_height+2, convexity=10) ', 'case cutout',
+                                         shared, precision)
+
+
+def _make_lid_hole(shape, shared, precision, fn=''):
+    if shape.is_circle and not shape.islands:
+        yield f'    translate([{num(shape.point[0], precision)}, {num(shape.point[1], precision)}, inner_height])\n'
+        yield f'        cylinder(floor_height+2, {num(shape.radius, precision)}, {num(shape.radius, precision)}{fn});\n'
+    elif shape.is_rect and not shape.islands:
+        yield f'    translate([{num(shape.point[0], precision)}, {num(shape.point[1], precision)}, ' \
+              f'inner_height+floor_height])\n'
+        yield f'        cube([{num(shape.width, precision)}, {num(shape.height, precision)}, floor_height + 2], ' \
+              f'center=true);\n'
+    else:
+        yield from _make_shape_placement(shape, 'inner_height', 'linear_extrude(floor_height+2) ', 'lid hole', shared,
+                                         precision)
 
-    return result
+
+def _make_connector(conn, precision):
+    yield f'    // {conn.reference} {conn.footprint} {conn.description}\n'
+    bounds = ','.join(num(b, precision) for b in conn.bounds)
+    yield f'    translate([{num(conn.position[0], precision)}, {num(conn.position[1], precision)}, pcb_top])\n' \
+          f'    rotate([0, 0, {num(-conn.position[2], precision)}])\n' \
+          f'        #connector({bounds},{num(conn.prop_height + 0.2, precision)});\n\n'
 
 
-def generate(case, show_pcb=False):
+def _split_connectors(case):
     """
-    :type case: Case
+    Split the connectors in the ones that cut into the walls or the lid and the ones that are far enough inside the
+    case to not touch anything, subtracting those would only cost OpenSCAD time
     """
-    result = '/* [Rendering options] */\n'
-    result += '// Show placeholder PCB in OpenSCAD preview\n'
-    result += 'show_pcb = ' + ('true' if show_pcb else 'false') + ';\n'
-    result += '// Lid mounting method\n'
-    result += f'lid_model = "{case.lid_model}"; // [cap, inner-fit]\n'
-    result += '// Conditional rendering\n'
-    result += f'render = "case"; // [all, case, lid]\n'
-    result += '\n\n'
-
-    result += '/* [Dimensions] */\n'
-    result += '// Height of the PCB mounting stand-offs between the bottom of the case and the PCB\n'
-    result += f'standoff_height = {case.standoff_height};\n'
-    result += f'// PCB thickness\n'
-    result += f'pcb_thickness = {case.pcb_thickness};\n'
-    result += f'// Bottom layer thickness\n'
-    result += f'floor_height = {case.floor_thickness};\n'
-    result += f'// Case wall thickness\n'
-    result += f'wall_thickness = {case.wall_thickness};\n'
-    result += f'// Space between the top of the PCB and the top of the case\n'
-    result += f'headroom = {max(case.max_connector_height, case.max_part_height - case.standoff_height - case.pcb_thickness)};\n'
-    result += '\n'
-
-    for insert in case.get_inserts():
-        result += _make_insert_parameters(insert)
-
-    result += '/* [Hidden] */\n'
-    result += '$fa=$preview ? 10 : 4;\n'
-    result += '$fs=0.2;\n'
-    result += f'inner_height = floor_height + standoff_height + pcb_thickness + headroom;\n'
-    result += '\n'
-
-    result += _template.lstrip() + "\n"
-
-    for m in case.modules:
-        result += m + "\n"
-
-    result += _make_pcb_module(case)
-    result += _make_outline_module(case)
-    for insert in case.get_inserts():
-        result += _make_insert_module(insert[0])
-
-    center = case.get_center()
-    result += f'rotate([render == "lid" ? 180 : 0, 0, 0])\n'
-    result += f'scale([1, -1, 1])\n'
-    result += f'translate([-{center[0]}, -{center[1]}, 0]) ' + '{\n'
-
-    result += f'    pcb_top = floor_height + standoff_height + pcb_thickness;\n'
-    result += '\n'
-    result += '    difference() {\n'
-    result += f'        box(wall_thickness, floor_height, inner_height) ' + '{\n'
-    result += '            case_outline();\n'
-    result += '        }\n\n'
-
-    for shape in case.cutouts:
-        if shape.is_circle:
-            result += f'    translate([{shape.point[0]}, {shape.point[1]}, -1])\n'
-            result += f'        #cylinder(floor_height+2, {shape.radius}, {shape.radius});\n'
-        elif shape.is_rect:
-            result += f'    translate([{shape.point[0]}, {shape.point[1]}, 0])\n'
-            result += f'        #cube([{shape.width}, {shape.height}, floor_height + 2], center=true);\n'
-        else:
-            result += f'    translate([0, 0, -1])\n'
-            result += f'    #linear_extrude(floor_height+2, convexity=10) \n'
-            result += f'        {_make_scad_polygon(shape.path(), "case cutout")}\n'
-
-    for shape in case.lid_holes:
-        if shape.is_circle:
-            result += f'    translate([{shape.point[0]}, {shape.point[1]}, inner_height])\n'
-            result += f'        cylinder(floor_height+2, {shape.radius}, {shape.radius});\n'
-        elif shape.is_rect:
-            result += f'    translate([{shape.point[0]}, {shape.point[1]}, inner_height+floor_height])\n'
-            result += f'        cube([{shape.width}, {shape.height}, floor_height + 2], center=true);\n'
+    connectors = sorted(case.connectors, key=lambda x: x.reference)
+    if not case.prune_connectors or len(case.inner_path) == 0:
+        return connectors, []
+
+    # The edge of the lid reaches this far into the case, see the lid module
+    lid_edge = 1.2
+    headroom = max(case.max_connector_height, case.max_part_height - case.standoff_height - case.pcb_thickness)
+    pcb_top = case.floor_thickness + case.standoff_height + case.pcb_thickness
+    lid_bottom = pcb_top + headroom + case.floor_thickness + 0.1
+
+    outline = spatial.Outline(case.inner_path)
+    kept = []
+    pruned = []
+    for conn in connectors:
+        points = geometry.rotated_rect(conn.position, conn.bounds)
+        if pcb_top + conn.prop_height + 0.2 < lid_bottom and outline.polygon_clearance(points, lid_edge):
+            pruned.append(conn)
         else:
-            result += f'    translate([0, 0, inner_height])\n'
-            result += f'    linear_extrude(floor_height+2) \n'
-            result += f'        {_make_scad_polygon(shape.path(), "lid hole")}\n'
+            kept.append(conn)
+    return kept, pruned
 
-    for conn in sorted(case.connectors, key=lambda x: x.reference):
-        result += f'    // {conn.reference} {conn.footprint} {conn.description}\n'
-        result += f'    translate([{conn.position[0]}, {conn.position[1]}, pcb_top])\n' \
-                  f'    rotate([0, 0, {-conn.position[2]}])\n' \
-                  f'        #connector({conn.bounds[0]},{conn.bounds[1]},{conn.bounds[2]},{conn.bounds[3]},{conn.prop_height + 0.2});\n\n'
 
+def _make_subtractions(case, shared, connectors, cutouts=True):
+    """
+    Everything that gets cut out of the box, as a list of (position, chunks) in the order it is emitted in
+    """
+    precision = case.precision
+    result = []
+    for shape in case.cutouts if cutouts else []:
+        bounds = shape.bounds()
+        center = (bounds[0] + bounds[2]) / 2, (bounds[1] + bounds[3]) / 2
+        result.append((center, _make_cutout(shape, shared, precision, _fn(case))))
+    for shape in case.lid_holes:
+        bounds = shape.bounds()
+        center = (bounds[0] + bounds[2]) / 2, (bounds[1] + bounds[3]) / 2
+        result.append((center, _make_lid_hole(shape, shared, precision, _fn(case))))
+    for conn in connectors:
+        result.append((conn.position, _make_connector(conn, precision)))
     for part in case.parts:
         if part.substract is None:
             continue
+        result.append((part.position, _make_part(part, '    ', precision, substract=True)))
+    return result
+
+
+def _group_subtractions(subtractions, bounds, cells=3):
+    """
+    Bucket the subtractions into a grid over the case so OpenSCAD unions a few nearby shapes at a time and the
+    difference with the box only has a handful of children. Positions outside the case end up in the cells along
+    the wall they are closest to.
+    """
+    width = max(bounds[2] - bounds[0], 1e-9)
+    height = max(bounds[3] - bounds[1], 1e-9)
+    groups = {}
+    for position, chunks in subtractions:
+        column = min(max(int((position[0] - bounds[0]) / width * cells), 0), cells - 1)
+        row = min(max(int((position[1] - bounds[1]) / height * cells), 0), cells - 1)
+        groups.setdefault((row, column), []).append((position, chunks))
+    return [groups[key] for key in sorted(groups)]
+
+
+def _make_parameters(case, show_pcb, render=None):
+    yield '/* [Rendering options] */\n'
+    yield '// Show placeholder PCB in OpenSCAD preview\n'
+    yield 'show_pcb = ' + ('true' if show_pcb else 'false') + ';\n'
+    yield '// Lid mounting method\n'
+    yield f'lid_model = "{case.lid_model}"; // [cap, inner-fit]\n'
+    yield '// Conditional rendering\n'
+    if render is None:
+        yield f'render = "case"; // [all, case, lid]\n'
+    else:
+        yield f'render = "{render}";\n'
+    yield '\n\n'
+
+    yield '/* [Dimensions] */\n'
+    yield '// Height of the PCB mounting stand-offs between the bottom of the case and the PCB\n'
+    yield f'standoff_height = {case.standoff_height};\n'
+    yield f'// PCB thickness\n'
+    yield f'pcb_thickness = {case.pcb_thickness};\n'
+    yield f'// Bottom layer thickness\n'
+    yield f'floor_height = {case.floor_thickness};\n'
+    yield f'// Case wall thickness\n'
+    yield f'wall_thickness = {case.wall_thickness};\n'
+    yield f'// Space between the top of the PCB and the top of the case\n'
+    yield f'headroom = {max(case.max_connector_height, case.max_part_height - case.standoff_height - case.pcb_thickness)};\n'
+    yield '\n'
+
+    # Sorted so the output doesn't depend on the set order, which changes between runs
+    for insert in sorted(case.get_inserts()):
+        yield from _make_insert_parameters(insert)
+
+    yield '/* [Hidden] */\n'
+    tier = tiers[case.quality]
+    if tier['preview_fa'] == tier['fa']:
+        yield f'$fa={tier["fa"]};\n'
+    else:
+        yield f'$fa=$preview ? {tier["preview_fa"]} : {tier["fa"]};\n'
+    yield f'$fs={tier["fs"]};\n'
+    yield f'inner_height = floor_height + standoff_height + pcb_thickness + headroom;\n'
+    yield '\n'
 
-        result += _make_part(part, '    ', substract=True)
 
-    result += '    }\n\n'
+def _make_library(case, shared, shared_modules, precompute_offsets, csg):
+    if precompute_offsets:
+        yield _template.lstrip().replace('offset(r=', 'outline_offset(r=') + "\n"
+    else:
+        yield _template.lstrip() + "\n"
 
-    result += '    if (show_pcb && $preview) {\n'
-    result += '        translate([0, 0, floor_height + standoff_height])\n'
-    result += '            pcb();\n'
-    result += '    }\n\n'
+    # Sorted so the output doesn't depend on the set order of the footprint modules
+    for m in sorted(case.modules):
+        yield m + "\n"
 
-    result += '    if (render == "all" || render == "case") {\n'
+    yield from _make_shared_modules(shared_modules, case.precision)
+    yield from _make_pcb_module(case, shared)
+    yield from _make_outline_module(case)
+    if precompute_offsets:
+        yield from _make_offset_module(case)
+    for insert in sorted(case.get_inserts()):
+        yield from _make_insert_module(insert[0], csg, _fn(case))
+
+
+def _make_case_parts(case, csg):
+    precision = case.precision
+    yield '    if (show_pcb && $preview) {\n'
+    yield '        translate([0, 0, floor_height + standoff_height])\n'
+    yield '            pcb();\n'
+    yield '    }\n\n'
+
+    yield '    if (render == "all" || render == "case") {\n'
     for mount in case.pcb_mount:
-        result += f'        // {mount.ref} [{mount.insert}]\n'
-        result += f'        translate([{mount.position[0]}, {mount.position[1]}, floor_height])\n'
+        yield f'        // {mount.ref} [{mount.insert}]\n'
+        yield f'        translate([{num(mount.position[0], precision)}, {num(mount.position[1], precision)}, ' \
+              f'floor_height])\n'
         # This currently creates correct holes for the M3 threaded metal inserts I have. Not generic
-        result += f'        mount({mount.drill}, {mount.size}, standoff_height)\n'
-        result += f'            Insert_{esc(mount.insert[0])}();\n'
+        drill = num(mount.drill, precision)
+        size = num(mount.size, precision)
+        if csg == 'grouped':
+            # All mounts with the same insert are the same geometry below the translate, so OpenSCAD only has to
+            # build it once
+            yield f'        render() mount({drill}, {size}, standoff_height{_fn(case)})\n'
+        else:
+            yield f'        mount({drill}, {size}, standoff_height{_fn(case)})\n'
+        yield f'            Insert_{esc(mount.insert[0])}();\n'
 
     has_constrained = False
     for part in case.parts:
@@ -289,35 +523,187 @@ def generate(case, show_pcb=False):
             break
 
     if has_constrained:
-        result += '        intersection() {\n'
-        result += '            translate([0, 0, floor_height])\n'
-        result += '            linear_extrude(inner_height)\n'
-        result += '                case_outline();\n\n'
-        result += '            union() {\n\n'
+        yield '        intersection() {\n'
+        yield '            translate([0, 0, floor_height])\n'
+        yield '            linear_extrude(inner_height)\n'
+        yield '                case_outline();\n\n'
+        yield '            union() {\n\n'
 
         for part in case.parts:
             if not part.constrain:
                 continue
             if part.add is None:
                 continue
-            result += _make_part(part, '            ')
+            yield from _make_part(part, '            ', precision)
 
-        result += '            }\n'
-        result += '        }\n'
+        yield '            }\n'
+        yield '        }\n'
 
     for part in case.parts:
         if part.add is None:
             continue
         if part.constrain:
             continue
-        result += _make_part(part, '        ')
+        yield from _make_part(part, '        ', precision)
 
-    result += '    }\n'
+    yield '    }\n'
 
-    for part in case.parts:
-        if part.lid is None:
-            continue
-        result += _make_part(part, '        ', lid=True)
 
-    result += '}\n'
+def _make_body(case, shared, csg, render=None):
+    """
+    The case itself. With render set to case or lid only the geometry of that half is emitted.
+    """
+    precision = case.precision
+    center = case.get_center()
+    yield f'rotate([render == "lid" ? 180 : 0, 0, 0])\n'
+    yield f'scale([1, -1, 1])\n'
+    yield f'translate([{num(-center[0], precision)}, {num(-center[1], precision)}, 0]) ' + '{\n'
+
+    yield f'    pcb_top = floor_height + standoff_height + pcb_thickness;\n'
+    yield '\n'
+    yield '    difference() {\n'
+    yield f'        box(wall_thickness, floor_height, inner_height) ' + '{\n'
+    yield '            case_outline();\n'
+    yield '        }\n\n'
+
+    connectors, pruned = _split_connectors(case)
+    for conn in pruned:
+        yield f'    // {conn.reference} {conn.footprint} is clear of the walls and lid, not cut out\n'
+    if pruned:
+        yield '\n'
+
+    subtractions = _make_subtractions(case, shared, connectors, cutouts=render != 'lid')
+    if csg == 'grouped':
+        for group in _group_subtractions(subtractions, case.get_inner_bounds()):
+            yield '    union() {\n'
+            for position, chunks in group:
+                yield from chunks
+            yield '    }\n\n'
+    else:
+        for position, chunks in subtractions:
+            yield from chunks
+
+    yield '    }\n\n'
+
+    if render != 'lid':
+        yield from _make_case_parts(case, csg)
+
+    if render != 'case':
+        for part in case.parts:
+            if part.lid is None:
+                continue
+            yield from _make_part(part, '        ', precision, lid=True)
+
+    yield '}\n'
+
+
+def generate_chunks(case, show_pcb=False, precompute_offsets=False, csg='flat'):
+    """
+    Generate the OpenSCAD file as a stream of strings
+    :type case: Case
+    """
+    shared, shared_modules = _find_shared_shapes(case)
+    yield from _make_parameters(case, show_pcb)
+    yield from _make_library(case, shared, shared_modules, precompute_offsets, csg)
+    yield from _make_body(case, shared, csg)
+
+
+def generate_split_chunks(case, library, show_pcb=False, precompute_offsets=False, csg='flat'):
+    """
+    Generate a library file with all the modules and two entry files that include it and only contain the case or
+    the lid, so both can be rendered at the same time. Returns a dict with the lib, case and lid streams.
+    :type case: Case
+    """
+    shared, shared_modules = _find_shared_shapes(case)
+
+    def entry(render):
+        yield from _make_parameters(case, show_pcb, render)
+        yield f'include <{library}>\n\n'
+        yield from _make_body(case, shared, csg, render)
+
+    return {
+        'lib': _make_library(case, shared, shared_modules, precompute_offsets, csg),
+        'case': entry('case'),
+        'lid': entry('lid'),
+    }
+
+
+def generate(case, show_pcb=False, precompute_offsets=False, csg='flat'):
+    """
+    :type case: Case
+    """
+    return ''.join(generate_chunks(case, show_pcb=show_pcb, precompute_offsets=precompute_offsets, csg=csg))
+
+
+def write(case, handle, show_pcb=False, precompute_offsets=False, csg='flat'):
+    """
+    Write the OpenSCAD file to an open file handle without building it in memory first
+    :type case: Case
+    """
+    for chunk in generate_chunks(case, show_pcb=show_pcb, precompute_offsets=precompute_offsets, csg=csg):
+        handle.write(chunk)
+
+
+def _digest(chunks):
+    digest = hashlib.sha256()
+    for chunk in chunks:
+        digest.update(chunk.encode())
+    return digest.hexdigest()
+
+
+def _header(digest):
+    return f'// turbocase digest {digest}\n'
+
+
+def write_file(path, chunks, force=False):
+    """
+    Write the chunks to path with a digest of the content on the first line. If the file already has exactly this
+    content it is not touched, so its modification time doesn't trigger new renders in a build system. The chunks
+    are written to a temporary file next to path while they are hashed, which replaces path when the content
+    differs. Returns True when the file was written.
+    """
+    temp = f'{path}.{os.getpid()}.tmp'
+    try:
+        digest = hashlib.sha256()
+        with open(temp, 'w') as handle:
+            # The digest is only known at the end, it has a fixed length so the header is filled in afterwards
+            handle.write(_header('0' * digest.digest_size * 2))
+            for chunk in chunks:
+                digest.update(chunk.encode())
+                handle.write(chunk)
+            digest = digest.hexdigest()
+            handle.seek(0)
+            handle.write(_header(digest))
+
+        if not force:
+            try:
+                with open(path) as handle:
+                    # The rest of the file is hashed too so hand edits are overwritten like before
+                    if handle.readline() == _header(digest) and _digest(handle) == digest:
+                        return False
+            except (OSError, UnicodeDecodeError):
+                pass
+
+        os.replace(temp, path)
+        return True
+    finally:
+        # Only left behind when the content was unchanged or writing failed
+        if os.path.exists(temp):
+            os.unlink(temp)
+
+
+def write_split(case, stem, show_pcb=False, precompute_offsets=False, csg='flat', force=False):
+    """
+    Write the library, case and lid files next to each other as stem_lib.scad, stem_case.scad and stem_lid.scad.
+    Returns the paths and if they were written or already up to date.
+    :type case: Case
+    """
+    library = f'{stem}_lib.scad'
+    streams = generate_split_chunks(case, os.path.basename(library), show_pcb=show_pcb,
+                                    precompute_offsets=precompute_offsets, csg=csg)
+
+    result = []
+    for name, chunks in streams.items():
+        path = f'{stem}_{name}.scad'
+        result.append((path, write_file(path, chunks, force=force)))
     return result
@@ -0,0 +1,183 @@
+import re
+
+from sexpdata import Symbol
+
+# Tokens inside a form that gets parsed. Groups: open, close, quoted string, bare atom
+_token_re = re.compile(r'\s*(?:(\()|(\))|"((?:[^"\\]|\\.)*)"|([^\s()"]+))', re.S)
+_escape_re = re.compile(r'\\(.)', re.S)
+_escapes = {'\\': '\\', '"': '"', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+# Skipping works on the raw bytes, only the brackets outside of strings matter there
+_skip_re = re.compile(rb'"(?:[^"\\]|\\.)*"|([()])', re.S)
+_string_re = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"', re.S)
+_not_bracket = bytes(c for c in range(256) if c not in b'()')
+_head_re = re.compile(rb'\s*\(\s*([^\s()"]+)')
+_root_re = re.compile(rb'\s*(?:(\()|(\))|"(?:[^"\\]|\\.)*"|[^\s()"]+)', re.S)
+
+
+class ParseError(ValueError):
+    pass
+
+
+def _unescape(match):
+    c = match.group(1)
+    return _escapes.get(c, '\\' + c)
+
+
+def _atom(token):
+    # Same conversion rules as sexpdata so the results can be used interchangeably
+    if token == 'nil':
+        return []
+    if token == 't':
+        return True
+    try:
+        return int(token)
+    except ValueError:
+        try:
+            return float(token)
+        except ValueError:
+            return Symbol(token)
+
+
+def parse(text):
+    """
+    Parse a single form from a string into nested lists like sexpdata.loads does
+    """
+    match = _token_re.match
+    stack = []
+    current = None
+    pos = 0
+    while True:
+        m = match(text, pos)
+        if m is None:
+            raise ParseError(f'Unexpected input at offset {pos}')
+        pos = m.end()
+        if m.group(1) is not None:
+            if current is not None:
+                stack.append(current)
+            current = []
+        elif m.group(2) is not None:
+            if current is None:
+                raise ParseError(f'Unexpected closing bracket at offset {m.start()}')
+            if not stack:
+                return current
+            parent = stack.pop()
+            parent.append(current)
+            current = parent
+        elif current is None:
+            raise ParseError(f'Expected a form at offset {m.start()}')
+        elif m.group(3) is not None:
+            value = m.group(3)
+            if '\\' in value:
+                value = _escape_re.sub(_unescape, value)
+            current.append(value)
+        else:
+            current.append(_atom(m.group(4)))
+
+
+def _reduce(chunk):
+    # Strip a chunk down to its unmatched brackets, this is always a run of closing brackets followed by a
+    # run of opening brackets. Everything happens in C, which matters for zones with hundreds of thousands of points
+    if b'"' in chunk:
+        if b'\\' in chunk:
+            chunk = _string_re.sub(b'', chunk)
+            if b'"' in chunk:
+                return None
+        else:
+            parts = chunk.split(b'"')
+            if len(parts) % 2 == 0:
+                return None
+            chunk = b''.join(parts[::2])
+    chunk = chunk.translate(None, _not_bracket)
+    while b'()' in chunk:
+        chunk = chunk.replace(b'()', b'')
+    return chunk
+
+
+def _scan(data, start, end, depth):
+    for m in _skip_re.finditer(data, start, end):
+        c = m.group(1)
+        if c == b'(':
+            depth += 1
+        elif c == b')':
+            depth -= 1
+            if depth == 0:
+                return m.end()
+    return None
+
+
+def _locate(data, start, end, depth):
+    # Find the exact closing bracket in a chunk that is known to contain it, line by line
+    while start < end:
+        newline = data.find(b'\n', start, end)
+        line_end = end if newline == -1 else newline + 1
+        reduced = _reduce(data[start:line_end])
+        if reduced is None:
+            return None
+        closing = len(reduced) - len(reduced.lstrip(b')'))
+        if closing >= depth:
+            last = data.rfind(b')', start, line_end)
+            if closing == depth == len(reduced) and _reduce(data[start:last]) == b')' * (depth - 1):
+                return last + 1
+            return _scan(data, start, line_end, depth)
+        depth += len(reduced) - 2 * closing
+        start = line_end
+    return None
+
+
+def skip_form(data, pos):
+    """
+    Find the end of the form starting at the opening bracket at pos without building any objects
+    """
+    # Chunks always end on a newline since KiCad never writes raw newlines inside strings, if that
+    # happens anyway the rest of the file is scanned token by token.
+    length = len(data)
+    depth = 1
+    start = pos + 1
+    size = 256
+    while start < length:
+        end = data.find(b'\n', min(start + size, length))
+        end = length if end == -1 else end + 1
+        reduced = _reduce(data[start:end])
+        if reduced is None:
+            break
+        closing = len(reduced) - len(reduced.lstrip(b')'))
+        if closing >= depth:
+            result = _locate(data, start, end, depth)
+            if result is None:
+                break
+            return result
+        depth += len(reduced) - 2 * closing
+        start = end
+        size = min(size * 4, 1 << 20)
+
+    result = _scan(data, pos, length, 0)
+    if result is None:
+        raise ParseError(f'Unterminated form starting at offset {pos}')
+    return result
+
+
+def forms(data):
+    """
+    Walk the children of the root form in the utf-8 encoded data without parsing them.
+    Yields the name and the byte range for every child form, skipping is done by matching brackets.
+    """
+    m = _head_re.match(data)
+    if m is None:
+        raise ParseError('Input does not start with a form')
+    pos = m.end()
+    while True:
+        m = _root_re.match(data, pos)
+        if m is None:
+            raise ParseError('Unterminated root form')
+        if m.group(1) is not None:
+            start = m.start(1)
+            pos = skip_form(data, start)
+            head = _head_re.match(data, start)
+            if head is not None:
+                yield head.group(1).decode(), start, pos
+        elif m.group(2) is not None:
+            return
+        else:
+            pos = m.end()
+
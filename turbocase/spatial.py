@@ -0,0 +1,214 @@
+import math
+
+from turbocase import geometry
+
+
+class GridIndex:
+    """
+    Uniform grid over bounding boxes. Items that would cover a huge number of cells, like the case outline,
+    are kept in a separate list that is returned for every query.
+    """
+
+    max_cells = 1024
+
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.large = []
+
+    def _range(self, bounds):
+        size = self.cell_size
+        return (math.floor(bounds[0] / size), math.floor(bounds[1] / size),
+                math.floor(bounds[2] / size), math.floor(bounds[3] / size))
+
+    def insert(self, item, bounds):
+        x1, y1, x2, y2 = self._range(bounds)
+        if (x2 - x1 + 1) * (y2 - y1 + 1) > self.max_cells:
+            self.large.append(item)
+            return
+        for x in range(x1, x2 + 1):
+            for y in range(y1, y2 + 1):
+                cell = (x, y)
+                if cell not in self.cells:
+                    self.cells[cell] = []
+                self.cells[cell].append(item)
+
+    def query_point(self, point):
+        """
+        All items that have the cell containing point in their bounds
+        """
+        size = self.cell_size
+        cell = math.floor(point[0] / size), math.floor(point[1] / size)
+        return self.large + self.cells.get(cell, [])
+
+    def query(self, bounds):
+        """
+        All items with bounds overlapping the cells of bounds, every item is returned once
+        """
+        x1, y1, x2, y2 = self._range(bounds)
+        seen = set()
+        result = []
+        for item in self.large:
+            seen.add(id(item))
+            result.append(item)
+        for x in range(x1, x2 + 1):
+            for y in range(y1, y2 + 1):
+                for item in self.cells.get((x, y), ()):
+                    if id(item) not in seen:
+                        seen.add(id(item))
+                        result.append(item)
+        return result
+
+
+def _contains_bounds(outer, inner):
+    return outer[0] <= inner[0] and outer[1] <= inner[1] and outer[2] >= inner[2] and outer[3] >= inner[3]
+
+
+def _bounds_area(bounds):
+    return (bounds[2] - bounds[0]) * (bounds[3] - bounds[1])
+
+
+def containment(paths):
+    """
+    Build the containment hierarchy for a list of closed paths. Returns the index of the smallest path that
+    contains each path, or None for paths that are not inside any other path.
+    """
+    bounds = [geometry.path_bounds(path) for path in paths]
+    if len(paths) == 0:
+        return []
+
+    sizes = sorted(max(b[2] - b[0], b[3] - b[1]) for b in bounds)
+    cell_size = sizes[len(sizes) // 2] or 1
+    index = GridIndex(cell_size)
+    for i, b in enumerate(bounds):
+        index.insert(i, b)
+
+    result = []
+    for i, path in enumerate(paths):
+        point = geometry.path_point(path)
+        parent = None
+        parent_area = None
+        for candidate in index.query_point(point):
+            if candidate == i or not _contains_bounds(bounds[candidate], bounds[i]):
+                continue
+            area = _bounds_area(bounds[candidate])
+            # Identical bounds can't be nested unless they are the same shape twice, pick one direction
+            if bounds[candidate] == bounds[i] and candidate > i:
+                continue
+            if parent_area is not None and area >= parent_area:
+                continue
+            if geometry.point_in_path(point, paths[candidate]):
+                parent = candidate
+                parent_area = area
+        result.append(parent)
+    return result
+
+
+def _segments_cross(a, b, c, d):
+    def side(p, q, r):
+        return (q[0] - p[0]) * (r[1] - p[1]) - (q[1] - p[1]) * (r[0] - p[0])
+
+    d1 = side(c, d, a)
+    d2 = side(c, d, b)
+    d3 = side(a, b, c)
+    d4 = side(a, b, d)
+    return ((d1 > 0) != (d2 > 0) and d1 != 0 and d2 != 0) and ((d3 > 0) != (d4 > 0) and d3 != 0 and d4 != 0)
+
+
+def self_intersects(points):
+    """
+    Test if any two non-adjacent edges of a closed polygon cross each other
+    """
+    count = len(points)
+    if count < 4:
+        return False
+    segments = []
+    lengths = []
+    for i in range(count):
+        a = points[i]
+        b = points[(i + 1) % count]
+        segments.append((min(a[0], b[0]), min(a[1], b[1]), max(a[0], b[0]), max(a[1], b[1])))
+        lengths.append(max(segments[-1][2] - segments[-1][0], segments[-1][3] - segments[-1][1]))
+
+    lengths.sort()
+    index = GridIndex(lengths[count // 2] or 1)
+    for i, bounds in enumerate(segments):
+        index.insert(i, bounds)
+
+    for i, bounds in enumerate(segments):
+        for j in index.query(bounds):
+            if j <= i + 1 or (i == 0 and j == count - 1):
+                continue
+            other = segments[j]
+            if other[0] > bounds[2] or other[2] < bounds[0] or other[1] > bounds[3] or other[3] < bounds[1]:
+                continue
+            if _segments_cross(points[i], points[(i + 1) % count], points[j], points[(j + 1) % count]):
+                return True
+    return False
+
+
+class Outline:
+    """
+    The inner outline of the case with a grid index over its edges for distance queries
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.edges = []
+        if path[0] == 'circle':
+            return
+        self.edges = geometry.polygon_edges(list(path))
+        self.max_x = geometry.path_bounds(path)[2]
+        lengths = sorted(max(abs(q[0] - p[0]), abs(q[1] - p[1])) for p, q in self.edges)
+        self.index = GridIndex(lengths[len(lengths) // 2] or 1)
+        for i, (p, q) in enumerate(self.edges):
+            self.index.insert(i, (min(p[0], q[0]), min(p[1], q[1]), max(p[0], q[0]), max(p[1], q[1])))
+
+    def contains(self, point):
+        if self.path[0] == 'circle':
+            return geometry.point_in_path(point, self.path)
+        # Even-odd test, only the edges near the ray to the right of the point are looked at
+        x, y = point[0], point[1]
+        inside = False
+        for i in self.index.query((x, y, self.max_x, y)):
+            p, q = self.edges[i]
+            if (q[1] > y) != (p[1] > y) and x < (p[0] - q[0]) * (y - q[1]) / (p[1] - q[1]) + q[0]:
+                inside = not inside
+        return inside
+
+    def clearance(self, point, radius):
+        """
+        Test if a circle around point stays clear of the outline edges
+        """
+        if self.path[0] == 'circle':
+            center = self.path[1]
+            return math.hypot(point[0] - center[0], point[1] - center[1]) + radius <= self.path[2]
+        bounds = (point[0] - radius, point[1] - radius, point[0] + radius, point[1] + radius)
+        for i in self.index.query(bounds):
+            p, q = self.edges[i]
+            if geometry.segment_point_distance(point, p, q) < radius:
+                return False
+        return True
+
+    def polygon_clearance(self, points, distance):
+        """
+        Test if a convex polygon is inside the outline and stays at least distance away from its edges
+        """
+        if self.path[0] == 'circle':
+            center = self.path[1]
+            return all(math.hypot(p[0] - center[0], p[1] - center[1]) + distance <= self.path[2] for p in points)
+        if not all(self.contains(p) for p in points):
+            return False
+        box = geometry.path_bounds(points)
+        bounds = (box[0] - distance, box[1] - distance, box[2] + distance, box[3] + distance)
+        for i in self.index.query(bounds):
+            p, q = self.edges[i]
+            # An outline corner can poke into the polygon without coming close to any of its corners
+            if geometry.point_in_path(p, points):
+                return False
+            for a, b in geometry.polygon_edges(points):
+                if min(geometry.segment_point_distance(a, p, q), geometry.segment_point_distance(b, p, q),
+                       geometry.segment_point_distance(p, a, b),
+                       geometry.segment_point_distance(q, a, b)) < distance:
+                    return False
+        return True
@@ -1,5 +1,7 @@
 import logging
 
+from turbocase.fmt import num
+
 try:
     import svgwrite
     from svgwrite.masking import Mask
@@ -11,54 +13,74 @@ except ImportError:
     svg_support = False
 
 
-def path_to_svg(path):
+def path_to_svg(path, precision):
     d = []
+    if path[0] == 'circle':
+        (x, y), r = path[1], path[2]
+        left, right = num(x - r, precision), num(x + r, precision)
+        x, y, r = num(x, precision), num(y, precision), num(r, precision)
+        d.append(f'M {left} {y} A {r} {r} 0 1 0 {right} {y} A {r} {r} 0 1 0 {left} {y} Z')
+        return d
     first = True
     for point in path:
         if first:
-            d.append(f'M {point[0]} {point[1]}')
+            d.append(f'M {num(point[0], precision)} {num(point[1], precision)}')
             first = False
         else:
-            d.append(f'L {point[0]} {point[1]}')
+            d.append(f'L {num(point[0], precision)} {num(point[1], precision)}')
     return d
 
 
 def generate_pcb(case):
+    precision = case.precision
     bounds = case.get_pcb_bounds()
     size = bounds[2] - bounds[0], bounds[3] - bounds[1]
 
-    svg = svgwrite.Drawing("board.svg", size=(f'{size[0]}mm', f'{size[1]}mm'),
-                           viewBox=f"{bounds[0]} {bounds[1]} {size[0]} {size[1]}")
+    svg = svgwrite.Drawing("board.svg", size=(f'{num(size[0], precision)}mm', f'{num(size[1], precision)}mm'),
+                           viewBox=' '.join(num(v, precision) for v in (bounds[0], bounds[1], size[0], size[1])))
 
-    d = path_to_svg(case.pcb_path)
+    d = path_to_svg(case.pcb_path, precision)
     svg.add(Path(d, id="pcb", fill="none", stroke="#FFF", stroke_width="0.1"))
 
     for hole in case.pcb_holes:
-        if hole.is_circle:
-            svg.add(Circle(center=hole.point, r=hole.radius, fill="white"))
+        if hole.is_circle and not hole.islands:
+            svg.add(Circle(center=(num(hole.point[0], precision), num(hole.point[1], precision)),
+                           r=num(hole.radius, precision), fill="white"))
         else:
-            d = path_to_svg(hole.path())
-            svg.add(Path(d, fill="#FFF"))
+            d = path_to_svg(hole.path(), precision)
+            if hole.islands:
+                for island in hole.islands:
+                    d += path_to_svg(island.path(), precision)
+                svg.add(Path(d, fill="#FFF", fill_rule="evenodd"))
+            else:
+                svg.add(Path(d, fill="#FFF"))
 
     return svg.tostring()
 
 
 def generate_case(case):
+    precision = case.precision
     bounds = case.get_inner_bounds()
     size = bounds[2] - bounds[0], bounds[3] - bounds[1]
 
-    svg = svgwrite.Drawing("board.svg", size=(f'{size[0]}mm', f'{size[1]}mm'),
-                           viewBox=f"{bounds[0]} {bounds[1]} {size[0]} {size[1]}")
+    svg = svgwrite.Drawing("board.svg", size=(f'{num(size[0], precision)}mm', f'{num(size[1], precision)}mm'),
+                           viewBox=' '.join(num(v, precision) for v in (bounds[0], bounds[1], size[0], size[1])))
 
-    d = path_to_svg(case.inner_path)
+    d = path_to_svg(case.inner_path, precision)
     svg.add(Path(d, id="pcb", fill="none", stroke="#FFF", stroke_width="0.1"))
 
     for hole in case.cutouts:
-        if hole.is_circle:
-            svg.add(Circle(center=hole.point, r=hole.radius, fill="white"))
+        if hole.is_circle and not hole.islands:
+            svg.add(Circle(center=(num(hole.point[0], precision), num(hole.point[1], precision)),
+                           r=num(hole.radius, precision), fill="white"))
         else:
-            d = path_to_svg(hole.path())
-            svg.add(Path(d, fill="#FFF"))
+            d = path_to_svg(hole.path(), precision)
+            if hole.islands:
+                for island in hole.islands:
+                    d += path_to_svg(island.path(), precision)
+                svg.add(Path(d, fill="#FFF", fill_rule="evenodd"))
+            else:
+                svg.add(Path(d, fill="#FFF"))
 
     return svg.tostring()
 
@@ -0,0 +1,125 @@
+import math
+
+from turbocase.vector import Vector
+
+try:
+    import numpy
+
+    numpy_support = True
+except ImportError:
+    numpy_support = False
+
+
+def _degrees(r):
+    deg = math.degrees(r) + 90
+    if deg < 0:
+        deg += 360
+    return deg % 360
+
+
+def _num_points(length, radius, tolerance=None):
+    if tolerance is None:
+        return max(int(abs(length) / 9) * max(int(radius / 3), 1), 1)
+
+    if not tolerance > 0:
+        raise ValueError(f'The arc tolerance has to be larger than 0, got {tolerance}')
+    # Largest angle a chord can span while staying within the tolerance from the arc
+    if tolerance >= abs(radius):
+        return 1
+    max_angle = math.degrees(2 * math.acos(1 - tolerance / abs(radius)))
+    return max(math.ceil(abs(length) / max_angle), 1)
+
+
+def _arc_parameters(start, mid, end, tolerance=None):
+    a = Vector(start[0], start[1])
+    b = Vector(end[0], end[1])
+    mid = Vector(mid[0], mid[1])
+
+    # Figure out the center and radius of the arc
+    v1 = (a + b) / 2 - mid
+    v2 = a - mid
+    cos_ang = (v1 * v2) / (v1.mag() * v2.mag())
+    radius = round((v2.mag() / 2) / cos_ang, 5)
+    c = mid + (v1 / v1.mag()) * radius
+    c = Vector(round(c.x, 5), round(c.y, 5))
+
+    # Calculate new points with the center at 0,0
+    a_c = a - c
+    b_c = b - c
+    m_c = mid - c
+    deg_a = _degrees(math.atan2(a_c.y, a_c.x))
+    deg_b = _degrees(math.atan2(b_c.y, b_c.x))
+    deg_m = _degrees(math.atan2(m_c.y, m_c.x))
+
+    # Swap angles to make them clockwise
+    if deg_a > deg_b:
+        deg_a, deg_b = deg_b, deg_a
+        start, end = end, start
+
+    # Swap around direction for big arcs
+    if not deg_a < deg_m < deg_b:
+        deg_a, deg_b = deg_b, deg_a
+        start, end = end, start
+
+    length = (deg_b - deg_a) % 360
+    step = length / _num_points(length, radius, tolerance)
+    count = int(math.ceil(length / step))
+    return c, radius, deg_a, step, count, (end[0], end[1])
+
+
+def arc_points(start, mid, end, tolerance=None):
+    """
+    Tessellate a single arc through start, mid and end. The points are returned clockwise and end on the
+    exact endpoint coordinates of the arc. Without a tolerance the legacy point density is used, otherwise
+    the minimal number of points that keeps the chord deviation below the tolerance.
+    """
+    c, radius, deg_a, step, count, end = _arc_parameters(start, mid, end, tolerance)
+    result = []
+    for i in range(count):
+        deg = i * step + deg_a
+        deg %= 360
+        rad = math.radians(deg - 90)
+        result.append((round(math.cos(rad), 5) * radius + c.x, round(math.sin(rad), 5) * radius + c.y))
+    result.append(end)
+    return result
+
+
+def _arc_points_numpy(arcs, tolerance):
+    # The per-arc setup is cheap and done exactly like arc_points so both backends produce the same point counts,
+    # the sampling of all points of all arcs is done in one batch
+    params = [_arc_parameters(*arc, tolerance) for arc in arcs]
+    counts = numpy.array([p[4] for p in params], dtype=int)
+    owner = numpy.repeat(numpy.arange(len(arcs)), counts)
+    offsets = numpy.cumsum(counts) - counts
+    index = numpy.arange(owner.size) - offsets[owner]
+
+    cx = numpy.array([p[0].x for p in params])[owner]
+    cy = numpy.array([p[0].y for p in params])[owner]
+    radius = numpy.array([p[1] for p in params])[owner]
+    deg_a = numpy.array([p[2] for p in params])[owner]
+    step = numpy.array([p[3] for p in params])[owner]
+
+    rad = numpy.radians((index * step + deg_a) % 360 - 90)
+    xs = (numpy.round(numpy.cos(rad), 5) * radius + cx).tolist()
+    ys = (numpy.round(numpy.sin(rad), 5) * radius + cy).tolist()
+
+    result = []
+    pos = 0
+    for p in params:
+        count = p[4]
+        points = list(zip(xs[pos:pos + count], ys[pos:pos + count]))
+        points.append(p[5])
+        result.append(points)
+        pos += count
+    return result
+
+
+def tessellate_arcs(arcs, tolerance=None):
+    """
+    Tessellate a list of (start, mid, end) arcs, using NumPy to do all of them in batch when it is available
+    """
+    if len(arcs) == 0:
+        return []
+    if numpy_support:
+        return _arc_points_numpy(arcs, tolerance)
+    return [arc_points(*arc, tolerance) for arc in arcs]
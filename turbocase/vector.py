@@ -1,7 +1,11 @@
+import operator
+from array import array
 from math import sqrt
 
 
 class Vector:
+    __slots__ = ['x', 'y']
+
     def __init__(self, x, y):
         self.x = x
         self.y = y
@@ -44,3 +48,70 @@ class Vector:
         if isinstance(other, tuple) or isinstance(other, list):
             return self.x == other[0] and self.y == other[1]
         return False
+
+
+class PointBuffer:
+    """
+    A path of 2D points stored as interleaved x/y doubles. Indexing and iterating gives (x, y) tuples.
+    The points can't be changed after construction since shapes share their memoized path.
+    """
+    __slots__ = ['_data', '_bounds']
+
+    def __init__(self, points=()):
+        data = array('d')
+        for point in points:
+            data.append(point[0])
+            data.append(point[1])
+        self._data = data
+        self._bounds = None
+
+    def bounds(self):
+        """
+        The (min_x, min_y, max_x, max_y) of the points, calculated once
+        """
+        if self._bounds is None:
+            if len(self._data) == 0:
+                raise ValueError('An empty path has no bounds')
+            xs = self._data[0::2]
+            ys = self._data[1::2]
+            self._bounds = min(xs), min(ys), max(xs), max(ys)
+        return self._bounds
+
+    @property
+    def xs(self):
+        return self._data[0::2]
+
+    @property
+    def ys(self):
+        return self._data[1::2]
+
+    def __len__(self):
+        return len(self._data) // 2
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return PointBuffer(self[i] for i in range(*item.indices(len(self))))
+        try:
+            item = operator.index(item)
+        except TypeError:
+            raise TypeError(f'PointBuffer indices must be integers or slices, not {type(item).__name__}') from None
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError('PointBuffer index out of range')
+        return self._data[item * 2], self._data[item * 2 + 1]
+
+    def __iter__(self):
+        coords = iter(self._data)
+        return zip(coords, coords)
+
+    def __eq__(self, other):
+        if isinstance(other, PointBuffer):
+            return self._data == other._data
+        return False
+
+    def __hash__(self):
+        return hash(self._data.tobytes())
+
+    def __repr__(self):
+        return f'<PointBuffer {len(self)} points>'